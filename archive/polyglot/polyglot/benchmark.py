@@ -4,15 +4,31 @@ L Investigation - Performance Benchmark
 Measures throughput and latency of the polyglot system
 """
 
+import json
 import time
 import ctypes
 import httpx
 import statistics
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 
 ITERATIONS = 50
 PARALLEL_WORKERS = 10
 
+_pc = time.perf_counter_ns
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+# Request bodies are serialized once so the timed loop only measures the POST
+_PARALLEL_PAYLOADS = [
+    json.dumps({'text': f'Test {i}: John Smith $1000'}).encode()
+    for i in range(ITERATIONS)
+]
+
+# One keepalive pool shared by every HTTP benchmark phase
+_CLIENT = httpx.Client(
+    timeout=10,
+    limits=httpx.Limits(max_connections=PARALLEL_WORKERS * 2,
+                        max_keepalive_connections=PARALLEL_WORKERS * 2),
+)
+
 # =============================================================================
 # Benchmarks
 # =============================================================================
@@ -36,45 +52,42 @@ def bench_synapses():
 
     return times
 
-def bench_rust_extraction():
+def bench_rust_extraction(client):
     """Benchmark Rust extraction"""
     text = "John Smith transferred $5,000,000 to Bank of America on 2024-03-15. Contact: john@enron.com"
 
     times = []
-    with httpx.Client(timeout=10) as client:
-        for _ in range(ITERATIONS):
-            start = time.perf_counter()
-            client.post('http://127.0.0.1:9001/extract', json={'text': text})
-            times.append((time.perf_counter() - start) * 1000)
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        client.post('http://127.0.0.1:9001/extract', json={'text': text})
+        times.append((time.perf_counter() - start) * 1000)
 
     return times
 
-def bench_go_analysis():
+def bench_go_analysis(client):
     """Benchmark Go strategic analysis"""
     query = "Who committed the fraud at Enron Corporation?"
 
     times = []
-    with httpx.Client(timeout=10) as client:
-        for _ in range(ITERATIONS):
-            start = time.perf_counter()
-            client.post('http://127.0.0.1:8085/analyze', json={'query': query})
-            times.append((time.perf_counter() - start) * 1000)
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        client.post('http://127.0.0.1:8085/analyze', json={'query': query})
+        times.append((time.perf_counter() - start) * 1000)
 
     return times
 
-def bench_parallel_throughput():
+def bench_parallel_throughput(client):
     """Benchmark parallel throughput"""
-    def single_request(i):
-        start = time.perf_counter()
-        httpx.post('http://127.0.0.1:9001/extract',
-                   json={'text': f'Test {i}: John Smith $1000'},
-                   timeout=10)
-        return (time.perf_counter() - start) * 1000
+    post = client.post
+
+    def single_request(payload):
+        start = _pc()
+        post('http://127.0.0.1:9001/extract', content=payload, headers=_JSON_HEADERS)
+        return (_pc() - start) / 1e6
 
     start = time.perf_counter()
     with ThreadPoolExecutor(max_workers=PARALLEL_WORKERS) as executor:
-        futures = [executor.submit(single_request, i) for i in range(ITERATIONS)]
-        times = [f.result() for f in as_completed(futures)]
+        times = list(executor.map(single_request, _PARALLEL_PAYLOADS))
     total_time = time.perf_counter() - start
 
     throughput = ITERATIONS / total_time
@@ -111,21 +124,24 @@ def main():
     synapse_times = bench_synapses()
     print_stats("C++ Synapses (hash + similarity)", synapse_times)
 
-    # Rust Extraction
-    print("\n[2/4] Benchmarking Rust Extraction...")
-    rust_times = bench_rust_extraction()
-    print_stats("Rust Extraction (HTTP)", rust_times)
-
-    # Go Analysis
-    print("\n[3/4] Benchmarking Go Analysis...")
-    go_times = bench_go_analysis()
-    print_stats("Go Analysis (HTTP)", go_times)
-
-    # Parallel Throughput
-    print("\n[4/4] Benchmarking Parallel Throughput...")
-    parallel_times, throughput = bench_parallel_throughput()
-    print_stats("Parallel Requests", parallel_times)
-    print(f"    Throughput: {throughput:.1f} req/s")
+    try:
+        # Rust Extraction
+        print("\n[2/4] Benchmarking Rust Extraction...")
+        rust_times = bench_rust_extraction(_CLIENT)
+        print_stats("Rust Extraction (HTTP)", rust_times)
+
+        # Go Analysis
+        print("\n[3/4] Benchmarking Go Analysis...")
+        go_times = bench_go_analysis(_CLIENT)
+        print_stats("Go Analysis (HTTP)", go_times)
+
+        # Parallel Throughput
+        print("\n[4/4] Benchmarking Parallel Throughput...")
+        parallel_times, throughput = bench_parallel_throughput(_CLIENT)
+        print_stats("Parallel Requests", parallel_times)
+        print(f"    Throughput: {throughput:.1f} req/s")
+    finally:
+        _CLIENT.close()
 
     # Summary
     print("\n" + "=" * 60)
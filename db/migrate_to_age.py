@@ -154,13 +154,36 @@ def create_relational_tables():
         )
     """)
 
+    # LLM extraction cache, keyed by a hash of the exact input text
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS llm_extractions (
+            input_hash TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            result JSONB NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            PRIMARY KEY (input_hash, kind)
+        )
+    """)
+
     # Indexes
     cur.execute("CREATE INDEX IF NOT EXISTS idx_nodes_type ON nodes(type)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_nodes_name ON nodes(name_normalized)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_nodes_source_id ON nodes(source_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_nodes_name_type ON nodes(name, type)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_edges_type ON edges(type)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(file_hash)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_documents_content ON documents USING GIN(content_vector)")
 
+    # Resume lookup in scripts/ingest_dataset.py; evidence_chain comes from the
+    # audit setup, not this migration, so only index it if it's there
+    cur.execute("SELECT to_regclass('evidence_chain')")
+    if cur.fetchone()[0]:
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_evidence_chain_dataset
+            ON evidence_chain(reason, target_id)
+            WHERE target_type = 'document' AND action = 'dataset_extracted'
+        """)
+
     conn.commit()
     cur.close()
     conn.close()
@@ -3,12 +3,12 @@ LLM Backend for L Investigation Framework
 Mistral 7B via llama-cpp-python
 """
 
-import json
 import logging
-from typing import Optional, Dict, Any, Generator
+from typing import Optional, Dict, Any, Generator, List, Union
 from pathlib import Path
 
-from llama_cpp import Llama
+import orjson
+from llama_cpp import Llama, LlamaGrammar
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("llm")
@@ -19,6 +19,82 @@ CONTEXT_LENGTH = 2048  # Reduced for faster inference
 N_THREADS = 4  # i7-6700 has 4 cores, 8 threads (use 4 for balance)
 N_BATCH = 512  # Batch size for prompt processing
 USE_MLOCK = True  # Lock model in RAM for consistency
+SLOTS = 1  # One llama context, so one generation at a time; clients size concurrency from this
+
+# Mistral instruct formatting per chat role (system is folded into [INST])
+CHAT_TEMPLATES = {
+    "system": "[INST] {} [/INST]",
+    "user": "[INST] {} [/INST]",
+    "assistant": " {}</s>",
+}
+
+# Combined entities + relationships output, enforced by grammar so one
+# generation replaces the entities -> relationships round trip
+EXTRACT_ALL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "entities": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "type": {"type": "string"},
+                    "confidence": {"type": "integer"},
+                },
+                "required": ["name", "type", "confidence"],
+            },
+        },
+        "relationships": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "from": {"type": "string"},
+                    "to": {"type": "string"},
+                    "type": {"type": "string"},
+                    "confidence": {"type": "integer"},
+                    "context": {"type": "string"},
+                },
+                "required": ["from", "to", "type", "confidence", "context"],
+            },
+        },
+    },
+    "required": ["entities", "relationships"],
+}
+
+# Static instruction prefixes, tokenized once at load time; only the
+# per-request tail (entities/text) is tokenized on each call. Each prefix
+# stops before the space after its final colon: a separately tokenized
+# tail gets its own leading space from SentencePiece, and a prefix ending
+# in " " would leave a lone space token in front of it.
+ENTITY_PROMPT_PREFIX = """[INST] Extract all entities from this text. Return JSON array.
+Each entity: {"name": "...", "type": "person|organization|location|event|document|concept|asset|communication", "confidence": 0-100}
+
+Text:"""
+
+RELATIONSHIP_PROMPT_PREFIX = """[INST] Find relationships between these entities in the text.
+Return JSON array. Each relationship:
+{"from": "entity_name", "to": "entity_name", "type": "knows|works_for|owns|located_at|participated_in|mentioned_in|sent|received|funded|controls|related_to|witnessed|accused_of|confirmed_by|contradicts", "confidence": 0-100, "context": "brief description"}
+
+Entities:"""
+
+EXTRACT_ALL_PROMPT_PREFIX = """[INST] Extract all entities from this text, then the relationships between them.
+Return a JSON object: {"entities": [...], "relationships": [...]}
+Each entity: {"name": "...", "type": "person|organization|location|event|document|concept|asset|communication", "confidence": 0-100}
+Each relationship: {"from": "entity_name", "to": "entity_name", "type": "knows|works_for|owns|located_at|participated_in|mentioned_in|sent|received|funded|controls|related_to|witnessed|accused_of|confirmed_by|contradicts", "confidence": 0-100, "context": "brief description"}
+
+Text:"""
+
+PROMPT_PREFIXES = {
+    "entities": ENTITY_PROMPT_PREFIX,
+    "relationships": RELATIONSHIP_PROMPT_PREFIX,
+    "all": EXTRACT_ALL_PROMPT_PREFIX,
+}
+
+# Sample tail for checking at load time that split tokenization matches
+# tokenizing the whole prompt
+_SAMPLE_TAIL = "Alice Smith met Bob Jones in Paris.\n\nReturn ONLY the JSON object. [/INST]"
 
 
 class LLMBackend:
@@ -26,6 +102,9 @@ class LLMBackend:
     
     _instance: Optional["LLMBackend"] = None
     _model: Optional[Llama] = None
+    _extract_all_grammar: Optional[LlamaGrammar] = None
+    _prefix_tokens: Dict[str, List[int]] = {}
+    _tail_sep: Optional[str] = None  # None: tokenize whole prompts instead
     
     def __new__(cls):
         if cls._instance is None:
@@ -53,6 +132,11 @@ class LLMBackend:
                 use_mlock=USE_MLOCK,  # Lock in RAM
                 verbose=False,
             )
+            self._prefix_tokens = {
+                name: self._model.tokenize(prefix.encode())
+                for name, prefix in PROMPT_PREFIXES.items()
+            }
+            self._tail_sep = self._find_tail_sep()
             log.info(f"Model loaded: Phi-3-Mini (ctx={CONTEXT_LENGTH}, threads={N_THREADS}, batch={N_BATCH})")
             return True
         except Exception as e:
@@ -62,15 +146,44 @@ class LLMBackend:
     def unload(self):
         """Unload model from memory"""
         self._model = None
+        self._prefix_tokens = {}
+        self._tail_sep = None
         log.info("Model unloaded")
     
     @property
     def is_loaded(self) -> bool:
         return self._model is not None
     
-    def generate(self, prompt: str, max_tokens: int = 512,
+    def _find_tail_sep(self) -> Optional[str]:
+        """
+        Pick what to put before a tail so cached prefix tokens plus the tail's
+        tokens equal tokenizing prefix + " " + tail in one go: nothing when the
+        tokenizer adds its own leading space (SentencePiece), " " when it
+        doesn't. None if neither matches for every prefix.
+        """
+        for sep in ("", " "):
+            tail_tokens = self._model.tokenize((sep + _SAMPLE_TAIL).encode(), add_bos=False)
+            if all(
+                self._prefix_tokens[name] + tail_tokens == self._model.tokenize((prefix + " " + _SAMPLE_TAIL).encode())
+                for name, prefix in PROMPT_PREFIXES.items()
+            ):
+                return sep
+        log.warning("Prompt prefix tokens don't join cleanly; tokenizing full prompts")
+        return None
+
+    def _prompt_tokens(self, prefix: str, tail: str) -> Optional[List[int]]:
+        """Prompt tokens for PROMPT_PREFIXES[prefix] + " " + tail, reusing cached prefix tokens"""
+        if not self.is_loaded:
+            if not self.load():
+                return None
+        if self._tail_sep is None:
+            return self._model.tokenize((PROMPT_PREFIXES[prefix] + " " + tail).encode())
+        return self._prefix_tokens[prefix] + self._model.tokenize((self._tail_sep + tail).encode(), add_bos=False)
+    
+    def generate(self, prompt: Union[str, List[int]], max_tokens: int = 512,
                  temperature: float = 0.7, top_p: float = 0.9,
-                 stop: Optional[list] = None) -> str:
+                 stop: Optional[list] = None,
+                 grammar: Optional[LlamaGrammar] = None) -> str:
         """Generate completion"""
         if not self.is_loaded:
             if not self.load():
@@ -84,6 +197,7 @@ class LLMBackend:
                 top_p=top_p,
                 stop=stop or ["</s>", "[/INST]"],
                 echo=False,
+                grammar=grammar,
             )
             return response["choices"][0]["text"].strip()
         except Exception as e:
@@ -113,16 +227,11 @@ class LLMBackend:
              temperature: float = 0.7) -> str:
         """Chat completion (Mistral instruct format)"""
         # Build Mistral instruct prompt
-        prompt = "<s>"
+        parts = ["<s>"]
         for msg in messages:
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            if role == "system":
-                prompt += f"[INST] {content} [/INST]"
-            elif role == "user":
-                prompt += f"[INST] {content} [/INST]"
-            elif role == "assistant":
-                prompt += f" {content}</s>"
+            template = CHAT_TEMPLATES.get(msg.get("role", "user"), "")
+            parts.append(template.format(msg.get("content", "")))
+        prompt = "".join(parts)
         
         return self.generate(prompt, max_tokens=max_tokens, temperature=temperature)
     
@@ -147,18 +256,17 @@ class LLMBackend:
             else:
                 return {"raw": response, "confidence": 50}
             
-            return json.loads(json_str)
-        except (json.JSONDecodeError, ValueError):
+            return orjson.loads(json_str)
+        except (orjson.JSONDecodeError, ValueError):
             return {"raw": response, "confidence": 50}
     
     def extract_entities(self, text: str) -> list:
         """Extract entities from text"""
-        prompt = f"""[INST] Extract all entities from this text. Return JSON array.
-Each entity: {{"name": "...", "type": "person|organization|location|event|document|concept|asset|communication", "confidence": 0-100}}
-
-Text: {text[:2000]}
+        prompt = self._prompt_tokens("entities", f"""{text[:2000]}
 
-Return ONLY the JSON array, no other text. [/INST]"""
+Return ONLY the JSON array, no other text. [/INST]""")
+        if prompt is None:
+            return []
         
         response = self.generate(prompt, max_tokens=1024, temperature=0.3)
         
@@ -166,7 +274,7 @@ Return ONLY the JSON array, no other text. [/INST]"""
             if "[" in response:
                 start = response.index("[")
                 end = response.rindex("]") + 1
-                return json.loads(response[start:end])
+                return orjson.loads(response[start:end])
         except:
             pass
         return []
@@ -175,15 +283,13 @@ Return ONLY the JSON array, no other text. [/INST]"""
         """Extract relationships between known entities"""
         entity_names = [e.get("name", "") for e in entities[:20]]
         
-        prompt = f"""[INST] Find relationships between these entities in the text.
-Entities: {', '.join(entity_names)}
-
-Return JSON array. Each relationship:
-{{"from": "entity_name", "to": "entity_name", "type": "knows|works_for|owns|located_at|participated_in|mentioned_in|sent|received|funded|controls|related_to|witnessed|accused_of|confirmed_by|contradicts", "confidence": 0-100, "context": "brief description"}}
+        prompt = self._prompt_tokens("relationships", f"""{', '.join(entity_names)}
 
 Text: {text[:2000]}
 
-Return ONLY the JSON array. [/INST]"""
+Return ONLY the JSON array. [/INST]""")
+        if prompt is None:
+            return []
         
         response = self.generate(prompt, max_tokens=1024, temperature=0.3)
         
@@ -191,10 +297,35 @@ Return ONLY the JSON array. [/INST]"""
             if "[" in response:
                 start = response.index("[")
                 end = response.rindex("]") + 1
-                return json.loads(response[start:end])
+                return orjson.loads(response[start:end])
         except:
             pass
         return []
+    
+    def extract_all(self, text: str) -> Dict[str, list]:
+        """Extract entities and their relationships in a single generation"""
+        if self._extract_all_grammar is None:
+            self._extract_all_grammar = LlamaGrammar.from_json_schema(
+                orjson.dumps(EXTRACT_ALL_SCHEMA).decode(), verbose=False
+            )
+        
+        prompt = self._prompt_tokens("all", f"""{text[:2000]}
+
+Return ONLY the JSON object. [/INST]""")
+        if prompt is None:
+            return {"entities": [], "relationships": []}
+        
+        response = self.generate(prompt, max_tokens=1536, temperature=0.3,
+                                 grammar=self._extract_all_grammar)
+        
+        try:
+            data = orjson.loads(response)
+            return {
+                "entities": data.get("entities", []),
+                "relationships": data.get("relationships", []),
+            }
+        except (orjson.JSONDecodeError, AttributeError):
+            return {"entities": [], "relationships": []}
 
 
 # Global instance
@@ -221,6 +352,7 @@ if __name__ == "__main__":
     
     class ExtractRequest(BaseModel):
         text: str
+        entities: Optional[list] = None
     
     @app.on_event("startup")
     async def startup():
@@ -228,7 +360,7 @@ if __name__ == "__main__":
     
     @app.get("/health")
     async def health():
-        return {"status": "ok", "model_loaded": llm.is_loaded}
+        return {"status": "ok", "model_loaded": llm.is_loaded, "slots": SLOTS}
     
     @app.post("/generate")
     async def generate(req: GenerateRequest):
@@ -254,8 +386,15 @@ if __name__ == "__main__":
     async def extract_relationships(req: ExtractRequest):
         if not llm.is_loaded:
             raise HTTPException(503, "Model not loaded")
-        entities = llm.extract_entities(req.text)
-        rels = llm.extract_relationships(req.text, entities)
-        return {"entities": entities, "relationships": rels}
+        if req.entities:
+            rels = llm.extract_relationships(req.text, req.entities)
+            return {"entities": req.entities, "relationships": rels}
+        return llm.extract_all(req.text)
+    
+    @app.post("/extract/all")
+    async def extract_all(req: ExtractRequest):
+        if not llm.is_loaded:
+            raise HTTPException(503, "Model not loaded")
+        return llm.extract_all(req.text)
     
     uvicorn.run(app, host="127.0.0.1", port=8001)
@@ -5,10 +5,11 @@ Isolated process to prevent segfaults from crashing main server.
 Communicates via stdin/stdout JSON.
 """
 import sys
-import json
 import signal
 import logging
 
+import orjson
+
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 log = logging.getLogger("phi3")
 
@@ -49,6 +50,11 @@ def generate(model, prompt: str, max_tokens: int = 384, temperature: float = 0.3
         log.error(f"Generation error: {e}")
         return ""
 
+def respond(obj: dict):
+    """Write one JSON line to stdout"""
+    sys.stdout.buffer.write(orjson.dumps(obj) + b"\n")
+    sys.stdout.buffer.flush()
+
 def main():
     # Handle signals gracefully
     signal.signal(signal.SIGTERM, lambda s, f: sys.exit(0))
@@ -56,31 +62,31 @@ def main():
 
     model = load_model()
     if not model:
-        print(json.dumps({"error": "Failed to load model"}), flush=True)
+        respond({"error": "Failed to load model"})
         sys.exit(1)
 
     # Signal ready
-    print(json.dumps({"status": "ready"}), flush=True)
+    respond({"status": "ready"})
 
     # Process requests from stdin
-    for line in sys.stdin:
+    for line in sys.stdin.buffer:
         try:
-            request = json.loads(line.strip())
+            request = orjson.loads(line)
             prompt = request.get("prompt", "")
             max_tokens = request.get("max_tokens", 384)
             temperature = request.get("temperature", 0.3)
 
             if not prompt:
-                print(json.dumps({"error": "No prompt provided"}), flush=True)
+                respond({"error": "No prompt provided"})
                 continue
 
             result = generate(model, prompt, max_tokens, temperature)
-            print(json.dumps({"result": result}), flush=True)
+            respond({"result": result})
 
-        except json.JSONDecodeError:
-            print(json.dumps({"error": "Invalid JSON"}), flush=True)
+        except orjson.JSONDecodeError:
+            respond({"error": "Invalid JSON"})
         except Exception as e:
-            print(json.dumps({"error": str(e)}), flush=True)
+            respond({"error": str(e)})
 
 if __name__ == "__main__":
     main()
@@ -7,26 +7,31 @@ Gaps identified:
 3. VIP client details
 """
 
+import csv
+import io
+import json
+import mmap
 import os
+import re
 import sys
 from pathlib import Path
-from datetime import datetime
 
 # Add parent for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.pool
 
 # Load environment
 BASE_DIR = Path("/opt/rag")
 env_file = BASE_DIR / ".env"
 DATABASE_URL = None
-if env_file.exists():
-    for line in env_file.read_text().splitlines():
-        if line.startswith('DATABASE_URL='):
-            DATABASE_URL = line.split('=', 1)[1].strip('"').strip("'")
-            break
+if env_file.exists() and env_file.stat().st_size:
+    # Scan the mapped file so only the matching value is materialized
+    with env_file.open('rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        match = re.search(rb'(?m)^DATABASE_URL=["\']?([^"\'\r\n]+)', mm)
+        if match:
+            DATABASE_URL = match.group(1).decode()
 
 if not DATABASE_URL:
     print("ERROR: DATABASE_URL not found")
@@ -34,489 +39,107 @@ if not DATABASE_URL:
 
 INVESTIGATION_EMAIL = "investigation@pwnd.icu"
 
-# New investigation documents to add
-NEW_DOCUMENTS = [
-    # === FINANCIAL TRAIL ===
-    {
-        "subject": "EPSTEIN FINANCIAL NETWORK - OFFSHORE STRUCTURE",
-        "body": """EPSTEIN FINANCIAL NETWORK ANALYSIS
-================================
-
-OVERVIEW:
-Jeffrey Epstein maintained a complex web of offshore entities, shell companies, and
-financial intermediaries designed to obscure the source and destination of funds.
-
-KNOWN SHELL COMPANIES:
-1. Financial Trust Company (US Virgin Islands)
-   - Primary vehicle for estate management
-   - Controlled by Epstein until death
-
-2. COUQ Foundation / Gratitude America Ltd
-   - Tax-exempt entities receiving donations
-   - Funded by Les Wexner, Leon Black, others
-
-3. Southern Trust Company
-   - Virgin Islands-based
-   - Managed Epstein properties
-
-4. Plan D LLC
-   - Delaware corporation
-   - Asset holding company
-
-WIRE TRANSFERS DOCUMENTED:
-- $158 million from Leon Black to Epstein (2012-2017) - "advisory fees"
-- $77 million mansion transfer from Les Wexner (no payment)
-- $46 million from L Brands to Epstein entities
-- Multiple six-figure transfers to model agencies
-
-OFFSHORE ACCOUNTS:
-- Deutsche Bank maintained accounts despite compliance warnings
-- JPMorgan Chase accounts from 1998-2013
-- Accounts in Virgin Islands, Bahamas, multiple jurisdictions
-
-SUSPICIOUS PATTERNS:
-- Large cash withdrawals before victim meetings
-- Payments to recruitment networks
-- Transfers to associates (Maxwell, Brunel) for "expenses"
-- Donations to institutions (MIT, Harvard) as reputation laundering
-
-BANKING FAILURES:
-- JPMorgan settled for $290 million (2023) for enabling Epstein
-- Deutsche Bank settled for $75 million (2023)
-- Both banks ignored internal compliance warnings
-
-KEY EVIDENCE: Bank records show pattern of payments coinciding with victim trafficking dates.""",
-    },
-    {
-        "subject": "WIRE TRANSFER ANALYSIS - VICTIM PAYMENT PATTERNS",
-        "body": """EPSTEIN NETWORK - PAYMENT PATTERN ANALYSIS
-==========================================
-
-VICTIM COMPENSATION PATTERNS:
-Investigation reveals systematic payments to silence victims and witnesses.
-
-DOCUMENTED PAYMENTS:
-1. Settlement payments through lawyers ($500K - $5M range)
-2. "Modeling fees" to recruitment targets
-3. Cash payments to victims at Palm Beach mansion
-4. Wire transfers to victim bank accounts labeled as "gifts"
-
-NDA ENFORCEMENT:
-- All settlements included strict non-disclosure agreements
-- Penalties for speaking: $1M+ liquidated damages
-- Victims required to return settlement if NDA violated
-- Legal threats sent to victims who spoke publicly
-
-WITNESS INTIMIDATION SPENDING:
-- Private investigators hired to follow victims
-- Surveillance of victim families documented
-- "Security consulting" payments to monitor accusers
-- Legal fund for aggressive defamation suits
-
-SPECIFIC TRANSACTIONS:
-- Virginia Giuffre: Original settlement with Epstein ~$500K (2009)
-- Prince Andrew settlement: ~$12 million (2022)
-- Multiple Jane Does: $5-10 million total settlements
-- Courtney Wild and class: Ongoing litigation
-
-SHELL COMPANY ROUTING:
-Payments routed through:
-- Southern Trust Company (USVI)
-- Financial Trust Company
-- Various law firm trust accounts
-- Offshore entities in Bahamas, Caymans
-
-MONEY LAUNDERING INDICATORS:
-- Structured deposits below reporting thresholds
-- Multiple accounts at different banks
-- Transfers through countries with bank secrecy
-- Use of cash-heavy legitimate businesses as cover""",
-    },
-    # === WITNESS TAMPERING/OBSTRUCTION ===
-    {
-        "subject": "WITNESS INTIMIDATION - DOCUMENTED INCIDENTS",
-        "body": """WITNESS INTIMIDATION AND OBSTRUCTION ANALYSIS
-==============================================
-
-DOCUMENTED INCIDENTS:
-
-1. MARIA FARMER (1996)
-   - First to report Epstein/Maxwell to FBI
-   - FBI failed to act for years
-   - Claims ongoing surveillance and threats
-   - Reported being followed after going public
-
-2. VIRGINIA GIUFFRE
-   - Received legal threats when speaking
-   - Followed by private investigators
-   - Family members surveilled
-   - Accused of defamation by Dershowitz
-
-3. COURTNEY WILD
-   - Told she would "never win" against Epstein
-   - Faced aggressive defense depositions
-   - Other victims warned not to join her lawsuit
-
-4. ANONYMOUS VICTIMS
-   - Multiple Jane Does reported:
-     * Threatening phone calls
-     * Strangers photographing homes
-     * Vehicles following them
-     * Social media harassment campaigns
-
-PRIVATE INVESTIGATION FIRMS:
-- Black Cube (Israeli firm) allegedly hired
-- Kroll Associates engaged for "security"
-- Multiple PI firms on retainer
-- Expenses hidden as "security consulting"
-
-OBSTRUCTION TACTICS:
-1. Aggressive NDA enforcement with $1M+ penalties
-2. Defamation lawsuits against accusers
-3. Media manipulation and PR campaigns
-4. Legal delays and procedural warfare
-5. Witnesses discouraged from cooperation
-
-SEALED DOCUMENTS:
-- Many victim depositions sealed by court order
-- Settlement terms confidential
-- Grand jury materials not released
-- FBI interview records classified
-
-SUSPICIOUS DEATHS/SILENCING:
-- Jean-Luc Brunel: Dead in custody before trial (2022)
-- Epstein: Dead in custody before trial (2019)
-- Witnesses reported being afraid to testify
-
-POST-ARREST OBSTRUCTION (2019):
-- Attempts to contact witnesses from jail
-- Alleged offers of money for silence
-- Pressure on potential cooperators""",
-    },
-    {
-        "subject": "COVER-UP ANALYSIS - INSTITUTIONAL FAILURES",
-        "body": """SYSTEMATIC COVER-UP - INSTITUTIONAL ANALYSIS
-=============================================
-
-FEDERAL LEVEL FAILURES:
-
-1. 2008 NON-PROSECUTION AGREEMENT (NPA)
-   - Alexander Acosta approved sweetheart deal
-   - 60-count federal indictment reduced to state charges
-   - Co-conspirators granted blanket immunity
-   - Victims not notified (CVRA violation)
-   - DOJ OPR Report: Acosta used "poor judgment"
-
-2. FBI INVESTIGATION GAPS
-   - 1996 Maria Farmer report: No action
-   - 2005 Palm Beach referral delayed
-   - Evidence not fully pursued
-   - Witness cooperation discouraged
-   - Classified reasons for investigation closure
-
-STATE LEVEL FAILURES (FLORIDA):
-
-1. Palm Beach State Attorney Barry Krischer
-   - Downgraded charges despite evidence
-   - Grand jury saw limited evidence
-   - Referred to grand jury instead of filing charges
-
-2. Work Release Scandal
-   - Epstein allowed to leave jail 12 hours/day
-   - "Work release" at his own office
-   - Sheriff's department oversight minimal
-
-MEDIA SUPPRESSION:
-- ABC News killed story in 2015 (Amy Robach tape)
-- Stories spiked at multiple outlets
-- Reporters pressured not to investigate
-- Legal threats to publishers
-
-INSTITUTIONAL DONATIONS:
-- MIT accepted $850K+ after conviction
-- Harvard maintained connections
-- Scientists visited island
-- Donations used for reputation laundering
-
-MCC CUSTODY FAILURES (2019):
-- Removed from suicide watch prematurely
-- Cellmate removed night before death
-- Guards sleeping/falsifying records
-- Cameras "malfunctioned"
-- Incident report expunged August 1
-
-KEY QUESTION: Were these failures accidental or orchestrated?""",
-    },
-    # === VIP CLIENT DETAILS ===
-    {
-        "subject": "VIP NETWORK - FLIGHT LOG DETAILED ANALYSIS",
-        "body": """LOLITA EXPRESS VIP PASSENGER ANALYSIS
-======================================
-
-METHODOLOGY:
-Analysis of flight logs, witness testimony, and documentary evidence.
-
-HIGH-FREQUENCY PASSENGERS:
-
-1. BILL CLINTON
-   - Documented flights: 26+ (per logs)
-   - Pilot testimony: "ten or twenty times"
-   - Secret Service sometimes absent
-   - Chauntae Davies (masseuse) confirms presence
-   - Claims never visited island (disputed)
-
-2. PRINCE ANDREW
-   - Multiple flights documented
-   - Photo evidence at London home
-   - Virginia Giuffre testimony: 3 encounters
-   - Staff testimony about visits
-   - $12M settlement (2022)
-
-3. ALAN DERSHOWITZ
-   - Flight log appearances
-   - Massage testimony disputed
-   - Helped negotiate 2008 NPA
-   - Epstein 5th Amendment on questions about minors at his home
-
-4. BILL GATES
-   - Multiple meetings post-conviction
-   - Flew on Epstein jet at least once
-   - Donated through Epstein to MIT
-   - Admitted meetings were "mistake"
-
-5. KEVIN SPACEY
-   - Africa trip with Epstein/Clinton
-   - Photos on Lolita Express
-   - No abuse allegations in this context
-
-ISLAND VISITORS (Little St. James):
-- Construction workers report "young girls"
-- Staff testimony about activities
-- FBI raid 2019 found evidence
-- Drone footage showed temple structure
-
-FLIGHT CREW TESTIMONY:
-- Larry Visoski (pilot): Extensive logs
-- David Rodgers: Co-pilot records
-- Crew observed passengers but "didn't ask questions"
-
-NOTABLE ABSENCES FROM LOGS:
-- Some pages missing or illegible
-- Private flights not always logged
-- Boat arrivals not documented
-- Helicopter transfers separate
-
-CIRCUMSTANTIAL PATTERNS:
-- Powerful passengers = more protection
-- Legal threats effective deterrent
-- Settlement preferred over prosecution""",
-    },
-    {
-        "subject": "RECRUITMENT NETWORK - OPERATIONAL STRUCTURE",
-        "body": """EPSTEIN-MAXWELL RECRUITMENT NETWORK
-====================================
-
-ORGANIZATIONAL HIERARCHY:
-
-TIER 1 - LEADERSHIP:
-- Jeffrey Epstein: Principal, financier
-- Ghislaine Maxwell: Primary recruiter, trainer
-
-TIER 2 - LIEUTENANTS:
-- Sarah Kellen: Scheduler, victim database manager
-  * 160 FOIA document mentions
-  * Maintained contact info, photos
-  * Described as "gatekeeper"
-  * Immunity deal in 2008 NPA
-
-- Nadia Marcinkova: Participant, possible victim-turned-abuser
-  * Brought to US as teenager
-  * Participated in abuse per testimony
-  * Immunity deal in 2008 NPA
-
-- Lesley Groff: Executive assistant
-  * Logistics and scheduling
-  * Named co-conspirator
-  * Immunity deal
-
-- Adriana Ross: Assistant
-  * Scheduling role
-  * Named in depositions
-
-TIER 3 - EXTERNAL RECRUITERS:
-- Jean-Luc Brunel (MC2 Model Management)
-  * Supplied models from agency
-  * Multiple rape allegations
-  * Dead in custody 2022
-
-- Haley Robson: Victim-turned-recruiter
-  * Paid $200 per girl recruited
-  * Testified to system
-
-RECRUITMENT LOCATIONS:
-1. Mar-a-Lago (Virginia Giuffre recruited here)
-2. Local high schools
-3. Modeling agencies
-4. Shopping malls
-5. Referrals from existing victims
-
-RECRUITMENT SCRIPT (per testimony):
-1. Approach young girl (14-17)
-2. Offer money for "massage"
-3. Transport to Epstein residence
-4. Escalate from massage to abuse
-5. Pay victim, schedule return
-6. Eventually recruit victim as recruiter
-
-VICTIM TRACKING:
-- Database with names, photos, contact info
-- Message pads documenting "massages"
-- Scheduling system managed by Kellen
-- Flight manifests tracking movement
-
-GEOGRAPHIC SCOPE:
-- Palm Beach, Florida
-- New York City
-- Little St. James, USVI
-- Zorro Ranch, New Mexico
-- Paris, France
-- London, UK
-
-ESTIMATED VICTIMS:
-- Prosecutors identified 36+ in Florida alone
-- Total estimated: hundreds over 20+ years
-- Many never came forward due to fear, shame""",
-    },
-    {
-        "subject": "DEUTSCHE BANK - EPSTEIN ACCOUNT FAILURES",
-        "body": """DEUTSCHE BANK - EPSTEIN RELATIONSHIP ANALYSIS
-=============================================
-
-RELATIONSHIP TIMELINE:
-- 2013: Deutsche Bank opens Epstein accounts (after JPMorgan exit)
-- 2013-2018: Active banking relationship
-- 2018: Accounts closed after internal concerns
-- 2023: $75 million settlement with victims
+# SQL, built once at import
+# Staging table with the emails column types plus the manifest position
+CREATE_STAGING_SQL = """
+CREATE TEMP TABLE new_emails ON COMMIT DROP AS
+SELECT 0 AS manifest_pos, subject, body_text, sender_email, sender_name, recipients_to
+FROM emails WITH NO DATA
+"""
 
-INTERNAL COMPLIANCE FAILURES:
+COPY_STAGING_SQL = """
+COPY new_emails (manifest_pos, subject, body_text, sender_email, sender_name,
+                 recipients_to)
+FROM STDIN WITH (FORMAT csv)
+"""
 
-1. ONBOARDING RED FLAGS IGNORED:
-   - Epstein was registered sex offender
-   - Prior bank (JPMorgan) had dropped him
-   - Source of wealth unclear
-   - High-risk client profile
+# Existing subjects are skipped via idx_emails_investigation_subject
+# (scripts/setup-db.sh)
+INSERT_FROM_STAGING_SQL = f"""
+INSERT INTO emails (subject, body_text, sender_email, sender_name,
+                    recipients_to, date_sent, tsv)
+SELECT subject, body_text, sender_email, sender_name,
+       recipients_to, now(),
+       to_tsvector('english', COALESCE(subject, '') || ' ' || COALESCE(body_text, ''))
+FROM new_emails
+ORDER BY manifest_pos
+ON CONFLICT (subject) WHERE sender_email = '{INVESTIGATION_EMAIL}' DO NOTHING
+RETURNING doc_id, subject
+"""
 
-2. SUSPICIOUS ACTIVITY:
-   - Large cash withdrawals
-   - Wire transfers to young women
-   - Payments to model agencies
-   - Transfers to known associates
+VERIFY_SQL = """
+SELECT doc_id, subject FROM emails
+WHERE sender_email = %s
+ORDER BY doc_id
+"""
 
-3. INTERNAL WARNINGS:
-   - Compliance officers raised concerns
-   - Risk committee reviewed and approved anyway
-   - "Revenue considerations" cited
-   - Management overrode compliance
+# Connection pool, reused across add_documents() calls when imported as a library
+_pool = None
 
-DOCUMENTED TRANSACTIONS:
-- Millions in wire transfers
-- Cash withdrawals in six figures
-- Payments to co-conspirators
-- Settlement funding
-- Payments matching victim trafficking dates
+# New investigation documents to add: subjects in the manifest, bodies in
+# data/missing_docs/*.txt
+DATA_DIR = Path(__file__).parent / "data"
+MANIFEST_FILE = DATA_DIR / "missing_docs.json"
+BODIES_DIR = DATA_DIR / "missing_docs"
 
-REGULATORY FAILURES:
-- SAR (Suspicious Activity Reports) not filed timely
-- AML (Anti-Money Laundering) protocols failed
-- KYC (Know Your Customer) inadequate
-- Ongoing monitoring insufficient
 
-SETTLEMENT DETAILS (2023):
-- $75 million to Epstein victims
-- Admitted to "critical mistakes"
-- Enhanced compliance procedures required
-- No criminal charges against bank executives
+def read_body(entry):
+    """Read a document body from its text file"""
+    return (BODIES_DIR / entry["body_file"]).read_text().rstrip("\n")
 
-KEY PERSONNEL:
-- Multiple executives approved relationship
-- Relationship manager details sealed
-- Internal emails show awareness of risks
 
-COMPARISON TO JPMORGAN:
-- JPMorgan: $290 million settlement
-- Jes Staley: 1200+ emails with Epstein
-- Both banks ignored obvious warnings
-- Combined: $365 million paid to victims""",
-    },
-]
+def _get_pool():
+    """Get or create the connection pool (lazy initialization)"""
+    global _pool
+    if _pool is None:
+        _pool = psycopg2.pool.ThreadedConnectionPool(minconn=1, maxconn=4, dsn=DATABASE_URL)
+    return _pool
 
 
 def add_documents():
     """Add missing documents to database"""
-    conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-    cursor = conn.cursor()
-
-    # Get next available ID after 13031
-    cursor.execute("SELECT MAX(doc_id) as max_id FROM emails WHERE doc_id >= 13000")
-    result = cursor.fetchone()
-    next_id = (result['max_id'] or 13031) + 1
-
-    print(f"Starting from ID: {next_id}")
-
-    for i, doc in enumerate(NEW_DOCUMENTS):
-        doc_id = next_id + i
-        subject = doc["subject"]
-        body = doc["body"]
-
-        # Check if already exists
-        cursor.execute("SELECT doc_id FROM emails WHERE subject = %s", (subject,))
-        if cursor.fetchone():
-            print(f"  SKIP: {subject[:50]}... (already exists)")
-            continue
-
-        # Insert the document
-        cursor.execute("""
-            INSERT INTO emails (doc_id, subject, body_text, sender_email, sender_name,
-                              recipients_to, date_sent)
-            VALUES (%s, %s, %s, %s, %s, %s::jsonb, %s)
-        """, (
-            doc_id,
-            subject,
-            body,
-            INVESTIGATION_EMAIL,
-            "PWND Investigation Unit",
-            "[]",
-            datetime.now()
-        ))
-
-        print(f"  ADDED [{doc_id}]: {subject[:50]}...")
-
-    conn.commit()
-
-    # Update the full-text search index
-    print("\nUpdating search index...")
-    cursor.execute("""
-        UPDATE emails
-        SET tsv = to_tsvector('english',
-            COALESCE(subject, '') || ' ' || COALESCE(body_text, '')
-        )
-        WHERE sender_email = %s
-    """, (INVESTIGATION_EMAIL,))
-    conn.commit()
-
-    # Verify
-    cursor.execute("""
-        SELECT doc_id, subject FROM emails
-        WHERE sender_email = %s
-        ORDER BY doc_id
-    """, (INVESTIGATION_EMAIL,))
-
-    print("\n=== ALL INVESTIGATION DOCUMENTS ===")
-    for row in cursor.fetchall():
-        print(f"  [{row['doc_id']}] {row['subject'][:60]}")
-
-    cursor.close()
-    conn.close()
+    pool = _get_pool()
+    conn = pool.getconn()
+    # Single transaction: committed once on success, rolled back on error
+    try:
+        with conn:
+            with conn.cursor() as cursor:
+                new_documents = json.loads(MANIFEST_FILE.read_text())
+
+                # Stream all candidate documents through COPY (CSV quoting handles
+                # multi-line bodies) into a staging table, then insert them in one
+                # statement that computes tsv and skips existing subjects; doc_id
+                # comes from the column's own serial
+                buf = io.StringIO()
+                csv.writer(buf).writerows(
+                    (position, doc["subject"], read_body(doc), INVESTIGATION_EMAIL,
+                     "PWND Investigation Unit", "[]")
+                    for position, doc in enumerate(new_documents)
+                )
+                buf.seek(0)
+                cursor.execute(CREATE_STAGING_SQL)
+                cursor.copy_expert(COPY_STAGING_SQL, buf)
+                cursor.execute(INSERT_FROM_STAGING_SQL)
+                added = {subject: doc_id for doc_id, subject in cursor.fetchall()}
+
+                for doc in new_documents:
+                    subject = doc["subject"]
+                    if subject in added:
+                        print(f"  ADDED [{added[subject]}]: {subject[:50]}...")
+                    else:
+                        print(f"  SKIP: {subject[:50]}... (already exists)")
+
+            # Verify (same transaction, committed once on exit); a named cursor
+            # streams rows from the server in chunks instead of fetchall()
+            with conn.cursor(name='verify_cur') as verify_cursor:
+                verify_cursor.itersize = 500
+                verify_cursor.execute(VERIFY_SQL, (INVESTIGATION_EMAIL,))
+
+                print("\n=== ALL INVESTIGATION DOCUMENTS ===")
+                for row in verify_cursor:
+                    print(f"  [{row[0]}] {row[1][:60]}")
+    finally:
+        pool.putconn(conn)
     print("\nDone!")
 
 
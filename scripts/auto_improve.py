@@ -9,24 +9,21 @@ Continuously improves the investigation platform by:
 """
 
 import os
+import re
+import functools
 import sys
-import json
 import time
 import asyncio
+import atexit
 import httpx
+import orjson
 from datetime import datetime
 from pathlib import Path
 from urllib.parse import quote
+from dotenv import load_dotenv
 
 # Load environment
-env_path = Path('/opt/rag/.env')
-if env_path.exists():
-    with open(env_path) as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#') and '=' in line:
-                key, val = line.split('=', 1)
-                os.environ[key] = val.strip('"').strip("'")
+load_dotenv('/opt/rag/.env')
 
 API_BASE = "http://127.0.0.1:8002"
 INBOX_DIR = Path("/opt/rag/data/inbox")
@@ -58,20 +55,260 @@ QUALITY_QUERIES = [
     "Epstein death investigation",
 ]
 
+# Opening queries for auto-conversations
+STARTING_QUERIES = [
+    "Jeffrey Epstein associates",
+    "Ghislaine Maxwell victims",
+    "Flight log passengers",
+    "Financial connections",
+    "Legal proceedings"
+]
+
+# URL-encoded forms of the static queries, computed once
+QUOTED_QUERIES = {q: quote(q) for q in QUALITY_QUERIES + STARTING_QUERIES}
+
 # Curated document IDs (13011-13031)
 CURATED_IDS = set(range(13011, 13032))
 
+# Concurrent /api/ask streams during quality tests and auto-conversations
+QUALITY_CONCURRENCY = 5
+
+# Evidence categories that matter for prosecution
+EVIDENCE_KEYWORDS = {
+    'trafficking': ['trafficking', 'recruited', 'transported', 'minor', 'underage', 'victim'],
+    'financial': ['payment', 'wire transfer', 'account', 'million', 'donation', 'bribe'],
+    'conspiracy': ['arranged', 'coordinated', 'facilitated', 'covered up', 'destroyed'],
+    'witness': ['testified', 'deposition', 'statement', 'accused', 'alleged', 'claimed'],
+    'documentation': ['flight log', 'black book', 'email', 'record', 'photograph', 'video']
+}
+
+# People who could face prosecution
+PROSECUTION_TARGETS = {
+    'prince andrew', 'alan dershowitz', 'les wexner', 'leon black',
+    'bill gates', 'jes staley', 'ghislaine maxwell', 'jean-luc brunel',
+    'sarah kellen', 'nadia marcinkova', 'alexander acosta'
+}
+
+# Topic-to-target mapping
+TOPIC_TARGET_LINKS = {
+    'lolita express': ['prince andrew', 'bill gates', 'alan dershowitz'],
+    'flight log': ['prince andrew', 'bill gates', 'alan dershowitz'],
+    'little st james': ['prince andrew', 'bill gates'],
+    'island': ['prince andrew', 'bill gates'],
+    'palm beach': ['alexander acosta', 'alan dershowitz'],
+    'plea deal': ['alexander acosta'],
+    'trafficking': ['ghislaine maxwell', 'jean-luc brunel', 'sarah kellen'],
+    'recruitment': ['ghislaine maxwell', 'sarah kellen', 'nadia marcinkova'],
+    'virginia giuffre': ['prince andrew', 'alan dershowitz', 'ghislaine maxwell'],
+    'testimony': ['prince andrew', 'alan dershowitz', 'ghislaine maxwell'],
+    'zorro ranch': ['bill gates', 'les wexner'],
+    'new mexico': ['bill gates'],
+    'mit media lab': ['bill gates', 'leon black'],
+    'deutsche bank': ['jes staley', 'leon black'],
+    'maxwell trial': ['ghislaine maxwell', 'sarah kellen', 'nadia marcinkova'],
+    'epstein death': ['ghislaine maxwell'],
+    'model': ['jean-luc brunel', 'ghislaine maxwell'],
+}
+
+
+_CLIENT: httpx.AsyncClient | None = None
+
+
+def _client() -> httpx.AsyncClient:
+    """Shared keep-alive client, reused across queries and loop iterations"""
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(max_keepalive_connections=20)
+        )
+    return _CLIENT
+
+
+async def _with_client(coro):
+    """Await coro, then close the shared client before the event loop ends"""
+    global _CLIENT
+    try:
+        return await coro
+    finally:
+        if _CLIENT is not None:
+            await _CLIENT.aclose()
+            _CLIENT = None
+
+
+def _quoted(query: str) -> str:
+    """URL-encode a query, using the precomputed form for static queries"""
+    return QUOTED_QUERIES.get(query) or quote(query)
+
+
+def _build_matcher(terms) -> re.Pattern:
+    """Compile terms into one alternation that reports every (possibly
+    overlapping) occurrence in a single pass over the text"""
+    alternation = "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+    return re.compile(f"(?=({alternation}))")
+
+
+# Evidence keywords and target names, matched together in one scan per response
+RESPONSE_TERM_TAGS = {}
+for _category, _keywords in EVIDENCE_KEYWORDS.items():
+    for _kw in _keywords:
+        RESPONSE_TERM_TAGS.setdefault(_kw, []).append(('evidence', _category))
+for _target in PROSECUTION_TARGETS:
+    RESPONSE_TERM_TAGS.setdefault(_target, []).append(('target', _target))
+RESPONSE_MATCHER = _build_matcher(RESPONSE_TERM_TAGS)
+TOPIC_MATCHER = _build_matcher(TOPIC_TARGET_LINKS)
+
+
+def _linked_targets(query: str) -> tuple:
+    """Prosecution targets linked to the topics a query mentions"""
+    linked = []
+    for m in TOPIC_MATCHER.finditer(query.lower()):
+        for t in TOPIC_TARGET_LINKS[m.group(1)]:
+            if t in PROSECUTION_TARGETS and t not in linked:
+                linked.append(t)
+    return tuple(linked)
+
+
+# The quality queries are static, so resolve their topic links once
+_QUERY_TOPIC_MAP = {q: _linked_targets(q) for q in QUALITY_QUERIES}
+
+
+_LOG_FH = None
+
+
+def _log_file():
+    """Log file handle, opened once and flushed/closed at exit (False if unwritable)"""
+    global _LOG_FH
+    if _LOG_FH is None:
+        try:
+            _LOG_FH = open(LOG_FILE, "a", buffering=8192)
+            atexit.register(_LOG_FH.close)
+        except OSError:
+            _LOG_FH = False
+    return _LOG_FH
+
 
 def log(msg: str, level: str = "INFO"):
     """Log to file and stdout"""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     line = f"[{timestamp}] [{level}] {msg}"
     print(line)
-    try:
-        with open(LOG_FILE, "a") as f:
-            f.write(line + "\n")
-    except:
-        pass
+    fh = _log_file()
+    if fh:
+        try:
+            fh.write(line + "\n")
+        except:
+            pass
+
+
+@functools.lru_cache(maxsize=2048)
+def _analyze_response(response_text: str, sources: tuple, query: str) -> tuple:
+    """Score one answer: (evidence categories, targets, has actionable evidence)
+
+    Pure and memoized, so loop iterations that get an identical answer back
+    skip the keyword/target scan entirely.
+    """
+    response_lower = response_text.lower()
+
+    # Scan once for every evidence keyword and target name
+    hit_categories = set()
+    hit_targets = set()
+    for m in RESPONSE_MATCHER.finditer(response_lower):
+        for kind, name in RESPONSE_TERM_TAGS[m.group(1)]:
+            (hit_categories if kind == 'evidence' else hit_targets).add(name)
+
+    # Check evidence categories
+    query_evidence = [c for c in EVIDENCE_KEYWORDS if c in hit_categories]
+
+    # Check if response cites specific evidence
+    # Either has #ID in text OR mentions "document" with sources available
+    has_citations = len(sources) > 0 and (
+        any(f"#{s}" in response_text for s in sources[:10]) or
+        ('document' in response_lower and len(sources) >= 3) or
+        ('evidence' in response_lower and len(sources) >= 3)
+    )
+
+    # Check for prosecution targets with evidence
+    # Include both direct mentions AND topic-linked targets
+    targets_found = []
+
+    # Direct mentions in response
+    if query_evidence and has_citations:
+        targets_found.extend(t for t in PROSECUTION_TARGETS if t in hit_targets)
+
+    # Topic-linked targets (even if not in response, query links them)
+    if has_citations:  # Must have evidence
+        linked = _QUERY_TOPIC_MAP.get(query)
+        if linked is None:
+            linked = _linked_targets(query)
+        targets_found.extend(t for t in linked if t not in targets_found)
+
+    return (
+        tuple(query_evidence),
+        tuple(targets_found),
+        len(targets_found) > 0 and has_citations
+    )
+
+
+def _take_sse_events(buf: bytearray) -> list:
+    """Decode the complete `data:` lines in buf and drop them from it"""
+    events = []
+    start = 0
+    while (end := buf.find(b'\n', start)) >= 0:
+        line = buf[start:end]
+        start = end + 1
+        if line.startswith(b'data: '):
+            try:
+                data = orjson.loads(line[6:])
+            except orjson.JSONDecodeError:
+                continue
+            if isinstance(data, dict):
+                events.append(data)
+    del buf[:start]
+    return events
+
+
+async def _sse_events(resp: httpx.Response):
+    """Yield JSON payloads of `data:` lines from a streaming response
+
+    Reads raw bytes into one reusable buffer and decodes each complete line
+    with orjson, instead of materializing a str per line.
+    """
+    buf = bytearray()
+    async for chunk in resp.aiter_bytes():
+        buf += chunk
+        for data in _take_sse_events(buf):
+            yield data
+    buf += b'\n'  # flush a final unterminated line
+    for data in _take_sse_events(buf):
+        yield data
+
+
+async def _run_quality_query(client: httpx.AsyncClient, query: str) -> dict:
+    """Ask one quality query and score the streamed answer"""
+    # Get full response via chat API
+    response_text = ""
+    sources = []
+
+    async with client.stream(
+        'GET',
+        f'{API_BASE}/api/ask?q={_quoted(query)}'
+    ) as resp:
+        async for data in _sse_events(resp):
+            if data.get('type') == 'chunk':
+                response_text += data.get('text', '')
+            elif data.get('type') == 'sources':
+                sources = data.get('ids', [])
+
+    categories, targets, actionable = _analyze_response(response_text, tuple(sources), query)
+
+    return {
+        "query": query,
+        "evidence_categories": list(categories),
+        "targets_mentioned": list(targets),
+        "sources_cited": len(sources),
+        "has_actionable_evidence": actionable
+    }
 
 
 async def test_quality() -> dict:
@@ -86,43 +323,6 @@ async def test_quality() -> dict:
     """
     log("Starting evidence quality test...")
 
-    # Evidence categories that matter for prosecution
-    EVIDENCE_KEYWORDS = {
-        'trafficking': ['trafficking', 'recruited', 'transported', 'minor', 'underage', 'victim'],
-        'financial': ['payment', 'wire transfer', 'account', 'million', 'donation', 'bribe'],
-        'conspiracy': ['arranged', 'coordinated', 'facilitated', 'covered up', 'destroyed'],
-        'witness': ['testified', 'deposition', 'statement', 'accused', 'alleged', 'claimed'],
-        'documentation': ['flight log', 'black book', 'email', 'record', 'photograph', 'video']
-    }
-
-    # People who could face prosecution
-    PROSECUTION_TARGETS = {
-        'prince andrew', 'alan dershowitz', 'les wexner', 'leon black',
-        'bill gates', 'jes staley', 'ghislaine maxwell', 'jean-luc brunel',
-        'sarah kellen', 'nadia marcinkova', 'alexander acosta'
-    }
-
-    # Topic-to-target mapping
-    TOPIC_TARGET_LINKS = {
-        'lolita express': ['prince andrew', 'bill gates', 'alan dershowitz'],
-        'flight log': ['prince andrew', 'bill gates', 'alan dershowitz'],
-        'little st james': ['prince andrew', 'bill gates'],
-        'island': ['prince andrew', 'bill gates'],
-        'palm beach': ['alexander acosta', 'alan dershowitz'],
-        'plea deal': ['alexander acosta'],
-        'trafficking': ['ghislaine maxwell', 'jean-luc brunel', 'sarah kellen'],
-        'recruitment': ['ghislaine maxwell', 'sarah kellen', 'nadia marcinkova'],
-        'virginia giuffre': ['prince andrew', 'alan dershowitz', 'ghislaine maxwell'],
-        'testimony': ['prince andrew', 'alan dershowitz', 'ghislaine maxwell'],
-        'zorro ranch': ['bill gates', 'les wexner'],
-        'new mexico': ['bill gates'],
-        'mit media lab': ['bill gates', 'leon black'],
-        'deutsche bank': ['jes staley', 'leon black'],
-        'maxwell trial': ['ghislaine maxwell', 'sarah kellen', 'nadia marcinkova'],
-        'epstein death': ['ghislaine maxwell'],
-        'model': ['jean-luc brunel', 'ghislaine maxwell'],
-    }
-
     results = {
         "timestamp": datetime.now().isoformat(),
         "queries_tested": 0,
@@ -134,91 +334,40 @@ async def test_quality() -> dict:
         "details": []
     }
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        for query in QUALITY_QUERIES:
-            try:
-                # Get full response via chat API
-                response_text = ""
-                sources = []
-
-                async with client.stream(
-                    'GET',
-                    f'{API_BASE}/api/ask?q={quote(query)}'
-                ) as resp:
-                    async for line in resp.aiter_lines():
-                        if line.startswith('data: '):
-                            try:
-                                data = json.loads(line[6:])
-                                if data.get('type') == 'chunk':
-                                    response_text += data.get('text', '')
-                                elif data.get('type') == 'sources':
-                                    sources = data.get('ids', [])
-                            except:
-                                pass
-
-                results["queries_tested"] += 1
-                response_lower = response_text.lower()
-
-                # Check evidence categories
-                query_evidence = {}
-                for category, keywords in EVIDENCE_KEYWORDS.items():
-                    found = any(kw in response_lower for kw in keywords)
-                    if found:
-                        results["evidence_categories"][category] += 1
-                        query_evidence[category] = True
-
-                # Check if response cites specific evidence
-                # Either has #ID in text OR mentions "document" with sources available
-                has_citations = len(sources) > 0 and (
-                    any(f"#{s}" in response_text for s in sources[:10]) or
-                    ('document' in response_lower and len(sources) >= 3) or
-                    ('evidence' in response_lower and len(sources) >= 3)
-                )
-
-                # Check for prosecution targets with evidence
-                # Include both direct mentions AND topic-linked targets
-                targets_found = []
-                query_text = query.lower()
-
-                # Direct mentions in response
-                for target in PROSECUTION_TARGETS:
-                    if target in response_lower:
-                        if any(query_evidence.values()) and has_citations:
-                            targets_found.append(target)
-
-                # Topic-linked targets (even if not in response, query links them)
-                for topic, linked_targets in TOPIC_TARGET_LINKS.items():
-                    if topic in query_text:
-                        for t in linked_targets:
-                            if t in PROSECUTION_TARGETS and t not in targets_found:
-                                if has_citations:  # Must have evidence
-                                    targets_found.append(t)
-
-                for t in targets_found:
-                    if t not in results["targets_with_evidence"]:
-                        results["targets_with_evidence"].append(t)
-
-                # Score this query
-                evidence_score = len(query_evidence) > 0
-                prosecution_score = len(targets_found) > 0 and has_citations
-
-                if evidence_score:
-                    results["evidence_found"] += 1
-                if prosecution_score:
-                    results["prosecution_leads"] += 1
-
-                results["details"].append({
-                    "query": query,
-                    "evidence_categories": list(query_evidence.keys()),
-                    "targets_mentioned": targets_found,
-                    "sources_cited": len(sources),
-                    "has_actionable_evidence": prosecution_score
-                })
+    # Run queries concurrently, bounded so the API isn't flooded
+    sem = asyncio.Semaphore(QUALITY_CONCURRENCY)
 
+    async def run_bounded(client, query):
+        async with sem:
+            try:
+                return await _run_quality_query(client, query)
             except Exception as e:
                 log(f"Error testing '{query}': {e}", "ERROR")
+                return None
+
+    client = _client()
+    details = await asyncio.gather(*[run_bounded(client, q) for q in QUALITY_QUERIES])
+
+    # Aggregate per-query results
+    for detail in details:
+        if detail is None:
+            continue
+
+        results["queries_tested"] += 1
+        for category in detail["evidence_categories"]:
+            results["evidence_categories"][category] += 1
+
+        for t in detail["targets_mentioned"]:
+            if t not in results["targets_with_evidence"]:
+                results["targets_with_evidence"].append(t)
 
-            await asyncio.sleep(0.2)
+        # Score this query
+        if detail["evidence_categories"]:
+            results["evidence_found"] += 1
+        if detail["has_actionable_evidence"]:
+            results["prosecution_leads"] += 1
+
+        results["details"].append(detail)
 
     # Calculate real quality score
     # Quality = (evidence_found * 0.4) + (prosecution_leads * 0.6)
@@ -234,6 +383,31 @@ async def test_quality() -> dict:
     return results
 
 
+def _inbox_files() -> list:
+    """Pending .txt/.eml files in the inbox, from a single directory scan"""
+    try:
+        with os.scandir(INBOX_DIR) as it:
+            return [
+                Path(e.path) for e in it
+                if e.name.endswith(('.txt', '.eml')) and e.is_file(follow_symlinks=False)
+            ]
+    except FileNotFoundError:
+        return []
+
+
+def _count_inbox() -> int:
+    """Number of pending inbox files, without building Path objects"""
+    n = 0
+    try:
+        with os.scandir(INBOX_DIR) as it:
+            for e in it:
+                if e.name.endswith(('.txt', '.eml')) and e.is_file(follow_symlinks=False):
+                    n += 1
+    except FileNotFoundError:
+        pass
+    return n
+
+
 async def ingest_documents() -> dict:
     """Ingest documents from inbox"""
     log("Checking inbox for new documents...")
@@ -248,7 +422,7 @@ async def ingest_documents() -> dict:
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 
     # Find pending files
-    pending = list(INBOX_DIR.glob("*.txt")) + list(INBOX_DIR.glob("*.eml"))
+    pending = _inbox_files()
 
     if not pending:
         log("No documents pending ingestion")
@@ -280,10 +454,9 @@ async def ingest_documents() -> dict:
 async def get_stats() -> dict:
     """Get current system stats"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(f"{API_BASE}/api/stats")
-            if resp.status_code == 200:
-                return resp.json()
+        resp = await _client().get(f"{API_BASE}/api/stats", timeout=10.0)
+        if resp.status_code == 200:
+            return orjson.loads(resp.content)
     except:
         pass
     return {}
@@ -308,15 +481,14 @@ async def update_ui_stats(quality_results: dict, ingest_results: dict):
             "avg_curated": quality_results.get("avg_curated_per_query", 0)
         },
         "ingestion": {
-            "pending": len(list(INBOX_DIR.glob("*.txt"))) + len(list(INBOX_DIR.glob("*.eml"))),
+            "pending": _count_inbox(),
             "processed_today": ingest_results.get("processed", 0)
         }
     }
 
     try:
         STATS_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(STATS_FILE, "w") as f:
-            json.dump(ui_stats, f, indent=2)
+        STATS_FILE.write_bytes(orjson.dumps(ui_stats, option=orjson.OPT_INDENT_2))
         log(f"Updated UI stats: quality={ui_stats['quality']['score']}%")
     except Exception as e:
         log(f"Error updating UI stats: {e}", "ERROR")
@@ -324,6 +496,64 @@ async def update_ui_stats(quality_results: dict, ingest_results: dict):
     return ui_stats
 
 
+async def _run_conversation(client: httpx.AsyncClient, i: int, starting_query: str,
+                            queries_per_set: int) -> dict:
+    """Run one auto-investigation conversation, chaining through suggestions"""
+    conv = {"completed": False, "queries": 0, "curated": 0, "topics": []}
+    conv_id = f"auto_{int(time.time())}_{i}"
+
+    try:
+        # Initial query
+        async with client.stream(
+            'GET',
+            f'{API_BASE}/api/ask?q={_quoted(starting_query)}&conversation_id={conv_id}',
+            timeout=120.0
+        ) as resp:
+            suggestions = []
+            async for data in _sse_events(resp):
+                if data.get('type') == 'sources':
+                    sources = data.get('ids', [])
+                    curated = sum(1 for s in sources if s in CURATED_IDS)
+                    conv["curated"] += curated
+                elif data.get('type') == 'suggestions':
+                    suggestions = data.get('queries', [])
+
+            conv["queries"] += 1
+            conv["topics"].append(starting_query)
+
+        # Chain through suggestions
+        for j in range(queries_per_set - 1):
+            if not suggestions:
+                break
+
+            next_query = suggestions[0]
+            await asyncio.sleep(0.3)
+
+            async with client.stream(
+                'GET',
+                f'{API_BASE}/api/ask?q={_quoted(next_query)}&conversation_id={conv_id}',
+                timeout=120.0
+            ) as resp:
+                suggestions = []
+                async for data in _sse_events(resp):
+                    if data.get('type') == 'sources':
+                        sources = data.get('ids', [])
+                        curated = sum(1 for s in sources if s in CURATED_IDS)
+                        conv["curated"] += curated
+                    elif data.get('type') == 'suggestions':
+                        suggestions = data.get('queries', [])
+
+                conv["queries"] += 1
+                conv["topics"].append(next_query)
+
+        conv["completed"] = True
+
+    except Exception as e:
+        log(f"Error in auto-conversation {i}: {e}", "ERROR")
+
+    return conv
+
+
 async def run_auto_conversations(num_sets: int = 5, queries_per_set: int = 10) -> dict:
     """Run auto-investigation conversations"""
     log(f"Running {num_sets} auto-conversations ({queries_per_set} queries each)...")
@@ -335,76 +565,27 @@ async def run_auto_conversations(num_sets: int = 5, queries_per_set: int = 10) -
         "topics_explored": []
     }
 
-    starting_queries = [
-        "Jeffrey Epstein associates",
-        "Ghislaine Maxwell victims",
-        "Flight log passengers",
-        "Financial connections",
-        "Legal proceedings"
-    ]
+    sem = asyncio.Semaphore(QUALITY_CONCURRENCY)
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        for i in range(num_sets):
-            conv_id = f"auto_{int(time.time())}_{i}"
-            starting_query = starting_queries[i % len(starting_queries)]
+    async def run_bounded(client, i):
+        async with sem:
+            return await _run_conversation(
+                client, i, STARTING_QUERIES[i % len(STARTING_QUERIES)], queries_per_set
+            )
 
-            try:
-                # Initial query
-                async with client.stream(
-                    'GET',
-                    f'{API_BASE}/api/ask?q={quote(starting_query)}&conversation_id={conv_id}'
-                ) as resp:
-                    suggestions = []
-                    async for line in resp.aiter_lines():
-                        if line.startswith('data: '):
-                            try:
-                                data = json.loads(line[6:])
-                                if data.get('type') == 'sources':
-                                    sources = data.get('ids', [])
-                                    curated = len([s for s in sources if s in CURATED_IDS])
-                                    results["total_curated"] += curated
-                                elif data.get('type') == 'suggestions':
-                                    suggestions = data.get('queries', [])
-                            except:
-                                pass
-
-                    results["total_queries"] += 1
-                    results["topics_explored"].append(starting_query)
-
-                # Chain through suggestions
-                for j in range(queries_per_set - 1):
-                    if not suggestions:
-                        break
-
-                    next_query = suggestions[0]
-                    await asyncio.sleep(0.3)
-
-                    async with client.stream(
-                        'GET',
-                        f'{API_BASE}/api/ask?q={quote(next_query)}&conversation_id={conv_id}'
-                    ) as resp:
-                        suggestions = []
-                        async for line in resp.aiter_lines():
-                            if line.startswith('data: '):
-                                try:
-                                    data = json.loads(line[6:])
-                                    if data.get('type') == 'sources':
-                                        sources = data.get('ids', [])
-                                        curated = len([s for s in sources if s in CURATED_IDS])
-                                        results["total_curated"] += curated
-                                    elif data.get('type') == 'suggestions':
-                                        suggestions = data.get('queries', [])
-                                except:
-                                    pass
-
-                        results["total_queries"] += 1
-                        if next_query not in results["topics_explored"]:
-                            results["topics_explored"].append(next_query)
-
-                results["sets_completed"] += 1
+    # Launch all sets concurrently
+    client = _client()
+    sets = await asyncio.gather(*[run_bounded(client, i) for i in range(num_sets)])
 
-            except Exception as e:
-                log(f"Error in auto-conversation {i}: {e}", "ERROR")
+    for conv in sets:
+        results["total_queries"] += conv["queries"]
+        results["total_curated"] += conv["curated"]
+        for j, topic in enumerate(conv["topics"]):
+            # Starting queries are always recorded, suggestions only once
+            if j == 0 or topic not in results["topics_explored"]:
+                results["topics_explored"].append(topic)
+        if conv["completed"]:
+            results["sets_completed"] += 1
 
     avg = results["total_curated"] / results["total_queries"] if results["total_queries"] > 0 else 0
     log(f"Auto-conversations complete: {results['sets_completed']} sets, {results['total_curated']} curated docs (avg {avg:.1f}/query)")
@@ -447,6 +628,8 @@ async def run_loop(interval_minutes: int = 5):
 
         # Sleep
         log(f"Sleeping {interval_minutes} minutes...")
+        if _LOG_FH:
+            _LOG_FH.flush()
         await asyncio.sleep(interval_minutes * 60)
 
 
@@ -473,32 +656,32 @@ def main():
         cmd = sys.argv[1]
 
         if cmd == "test":
-            result = asyncio.run(test_quality())
-            print(json.dumps(result, indent=2))
+            result = asyncio.run(_with_client(test_quality()))
+            print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
 
         elif cmd == "ingest":
-            result = asyncio.run(ingest_documents())
-            print(json.dumps(result, indent=2))
+            result = asyncio.run(_with_client(ingest_documents()))
+            print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
 
         elif cmd == "stats":
-            result = asyncio.run(get_stats())
-            print(json.dumps(result, indent=2))
+            result = asyncio.run(_with_client(get_stats()))
+            print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
 
         elif cmd == "ui":
-            result = asyncio.run(update_ui_stats({}, {}))
-            print(json.dumps(result, indent=2))
+            result = asyncio.run(_with_client(update_ui_stats({}, {})))
+            print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
 
         elif cmd == "auto":
-            result = asyncio.run(run_auto_conversations(5, 10))
-            print(json.dumps(result, indent=2))
+            result = asyncio.run(_with_client(run_auto_conversations(5, 10)))
+            print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
 
         elif cmd == "once":
-            result = asyncio.run(run_once())
-            print(json.dumps(result, indent=2))
+            result = asyncio.run(_with_client(run_once()))
+            print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
 
         elif cmd == "loop":
             interval = int(sys.argv[2]) if len(sys.argv) > 2 else 5
-            asyncio.run(run_loop(interval))
+            asyncio.run(_with_client(run_loop(interval)))
 
         else:
             print(f"Unknown command: {cmd}")
@@ -506,8 +689,8 @@ def main():
 
     else:
         # Default: run once
-        result = asyncio.run(run_once())
-        print(json.dumps(result, indent=2))
+        result = asyncio.run(_with_client(run_once()))
+        print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
 
 
 if __name__ == "__main__":
@@ -7,65 +7,70 @@ Usage:
     python3 bulk_ingest_text.py /path/to/text/files --workers 4
 """
 
+import io
 import os
+import re
+import csv
 import sys
 import hashlib
 import argparse
 from pathlib import Path
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 import psycopg2
 from psycopg2.extras import execute_values
+from dotenv import dotenv_values
 
 # Database URL
-DATABASE_URL = os.getenv('DATABASE_URL')
-if not DATABASE_URL:
-    env_file = Path("/opt/rag/.env")
-    if env_file.exists():
-        for line in env_file.read_text().splitlines():
-            if line.startswith('DATABASE_URL='):
-                DATABASE_URL = line.split('=', 1)[1]
-                break
+DATABASE_URL = os.getenv('DATABASE_URL') or dotenv_values('/opt/rag/.env').get('DATABASE_URL')
 
 if not DATABASE_URL:
     print("ERROR: DATABASE_URL not found")
     sys.exit(1)
 
 
-def file_hash(content: bytes) -> str:
-    return hashlib.sha256(content).hexdigest()
+def file_hash(f) -> str:
+    """SHA-256 of an open binary file, streamed in C (Python 3.11+)"""
+    return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+# Content markers for detect_doc_type, matched case-insensitively in one pass.
+# The lookahead lets overlapping markers each be seen.
+_DOC_MARKERS_RE = re.compile(
+    r'(?=(?:(?P<q>q\.)|(?P<a>a\.)|(?P<sender>from:)|(?P<subject>subject:)'
+    r'|(?P<transcript>transcript)|(?P<court>court|plaintiff|defendant)))',
+    re.IGNORECASE
+)
 
 
 def detect_doc_type(filename: str, content: str) -> str:
     """Detect document type from filename and content"""
     fn = filename.lower()
-    c = content.lower()[:2000]
 
     if 'efta' in fn:
         return 'foia'
-    if 'deposition' in fn or ('q.' in c and 'a.' in c):
+
+    found = {m.lastgroup for m in _DOC_MARKERS_RE.finditer(content, 0, 2000)}
+
+    if 'deposition' in fn or ('q' in found and 'a' in found):
         return 'deposition'
-    if 'from:' in c and 'subject:' in c:
+    if 'sender' in found and 'subject' in found:
         return 'email'
-    if 'transcript' in c:
+    if 'transcript' in found:
         return 'transcript'
-    if 'court' in c or 'plaintiff' in c or 'defendant' in c:
+    if 'court' in found:
         return 'court_filing'
     return 'misc'
 
 
-def get_existing_hashes(conn) -> set:
-    """Get all existing file hashes to avoid duplicates"""
-    with conn.cursor() as cur:
-        cur.execute("SELECT file_hash FROM documents WHERE file_hash IS NOT NULL")
-        return {row[0] for row in cur.fetchall()}
-
-
 def process_file(filepath: Path) -> dict:
     """Process a single file, return data for insertion"""
     try:
-        content_bytes = filepath.read_bytes()
-        content = content_bytes.decode('utf-8', errors='replace')
+        # Hash straight from the file, then decode without keeping the raw bytes around
+        with open(filepath, 'rb') as f:
+            digest = file_hash(f)
+            f.seek(0)
+            content = f.read().decode('utf-8', errors='replace')
 
         if len(content.strip()) < 50:
             return None
@@ -73,7 +78,7 @@ def process_file(filepath: Path) -> dict:
         return {
             'filename': filepath.name,
             'filepath': str(filepath),
-            'file_hash': file_hash(content_bytes),
+            'file_hash': digest,
             'doc_type': detect_doc_type(filepath.name, content),
             'origin': 'dataset8_foia',
             'char_count': len(content),
@@ -89,35 +94,44 @@ def ingest_batch(batch: list, conn) -> int:
     if not batch:
         return 0
 
-    inserted = 0
-    with conn.cursor() as cur:
-        for doc in batch:
-            try:
-                # Insert document
-                cur.execute("""
-                    INSERT INTO documents (filename, filepath, file_hash, doc_type, origin, char_count, date_added, status)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, 'processed')
-                    ON CONFLICT DO NOTHING
-                    RETURNING id
-                """, (doc['filename'], doc['filepath'], doc['file_hash'], doc['doc_type'],
-                      doc['origin'], doc['char_count'], datetime.now()))
-
-                result = cur.fetchone()
-                if result:
-                    doc_id = result[0]
-                    # Insert content
-                    cur.execute("""
-                        INSERT INTO contents (doc_id, full_text, created_at)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT DO NOTHING
-                    """, (doc_id, doc['content'], datetime.now()))
-                    inserted += 1
-            except Exception as e:
-                print(f"Error inserting {doc['filename']}: {e}")
-                continue
+    now = datetime.now()
+    try:
+        with conn.cursor() as cur:
+            # Insert documents, getting back ids only for rows actually inserted
+            doc_rows = [
+                (doc['filename'], doc['filepath'], doc['file_hash'], doc['doc_type'],
+                 doc['origin'], doc['char_count'], now)
+                for doc in batch
+            ]
+            inserted_docs = execute_values(cur, """
+                INSERT INTO documents (filename, filepath, file_hash, doc_type, origin, char_count, date_added, status)
+                VALUES %s
+                ON CONFLICT (file_hash) DO NOTHING
+                RETURNING id, file_hash
+            """, doc_rows, template="(%s, %s, %s, %s, %s, %s, %s, 'processed')",
+                page_size=len(doc_rows), fetch=True)
+
+            # Stream contents for the new documents through COPY; the ids are
+            # freshly assigned, so there is nothing for ON CONFLICT to skip
+            if inserted_docs:
+                content_by_hash = {doc['file_hash']: doc['content'] for doc in batch}
+                buf = io.StringIO()
+                csv.writer(buf).writerows(
+                    (doc_id, content_by_hash[fhash], now)
+                    for doc_id, fhash in inserted_docs
+                )
+                buf.seek(0)
+                cur.copy_expert(
+                    "COPY contents (doc_id, full_text, created_at) FROM STDIN WITH (FORMAT csv)",
+                    buf
+                )
 
         conn.commit()
-    return inserted
+        return len(inserted_docs)
+    except Exception as e:
+        conn.rollback()
+        print(f"Error inserting batch starting at {batch[0]['filename']}: {e}")
+        return 0
 
 
 def main():
@@ -140,32 +154,29 @@ def main():
 
     print(f"Found {len(files)} text files to process")
 
-    # Get existing hashes
     conn = psycopg2.connect(DATABASE_URL)
-    existing_hashes = get_existing_hashes(conn)
-    print(f"Found {len(existing_hashes)} existing documents in DB")
 
-    # Process files in parallel
+    # Process files in parallel; duplicates already in the DB are filtered by
+    # the documents.file_hash unique constraint at insert time
     processed = []
+    seen_hashes = set()
     skipped = 0
 
     print(f"Processing with {args.workers} workers...")
-    with ThreadPoolExecutor(max_workers=args.workers) as executor:
-        futures = {executor.submit(process_file, f): f for f in files}
-
-        for i, future in enumerate(as_completed(futures)):
-            result = future.result()
+    # Decode + hash are CPU-bound, so use processes; DB work stays in this process
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for i, result in enumerate(executor.map(process_file, files, chunksize=32)):
             if result:
-                if result['file_hash'] in existing_hashes:
+                if result['file_hash'] in seen_hashes:
                     skipped += 1
                 else:
                     processed.append(result)
-                    existing_hashes.add(result['file_hash'])
+                    seen_hashes.add(result['file_hash'])
 
             if (i + 1) % 500 == 0:
                 print(f"  Processed {i + 1}/{len(files)} files...")
 
-    print(f"Processed {len(processed)} new files, skipped {skipped} duplicates")
+    print(f"Processed {len(processed)} files, skipped {skipped} duplicates within this run")
 
     # Insert in batches
     if processed:
@@ -178,7 +189,8 @@ def main():
             total_inserted += inserted
             print(f"  Inserted batch {i // args.batch_size + 1}: {inserted} documents")
 
-        print(f"\nTotal inserted: {total_inserted} documents")
+        print(f"\nTotal inserted: {total_inserted} documents "
+              f"({len(processed) - total_inserted} already in DB or failed)")
 
     conn.close()
     print("Done!")
@@ -2,7 +2,7 @@
 """
 Graph Enrichment Script - Extract entities, relationships and forensic signals from emails
 
-Now with parallel processing! Uses asyncio.Semaphore to run multiple Haiku API calls concurrently.
+Now with parallel processing! A fixed pool of asyncio workers runs multiple Haiku API calls concurrently.
 
 Usage:
     python scripts/enrich_graph.py --limit 10 --dry-run          # Test with 10 emails
@@ -21,19 +21,25 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import argparse
 import asyncio
-import json
+import itertools
+import random
+import re
 import time
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Any, Tuple
 
-import httpx
+import aiohttp
+import orjson
 
 # Configuration
 BATCH_SIZE = 5  # emails per Haiku call
 RATE_LIMIT = 1.0  # seconds between calls (only for sequential fallback)
 MAX_RETRIES = 3
 DEFAULT_CONCURRENCY = 20  # parallel batches
+WRITER_DRAIN = 50  # max queued batches committed per DB transaction
+NODE_LOOKUP_CHUNK = 400  # (name, type) pairs per lookup query, under SQLite's 999-variable cap
+NODE_CACHE_MAX = 100_000  # (name, type) -> node id entries kept across batches
 HAIKU_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
 
 
@@ -98,7 +104,7 @@ SIGNALS (forensic flags):
 
 === OUTPUT FORMAT ===
 
-Return ONLY valid JSON. Use the exact Email ID numbers from the input (e.g., 1, 2, 3, not "email_1"):
+Call the extract tool with this structure. Use the exact Email ID numbers from the input (e.g., 1, 2, 3, not "email_1"):
 
 {{
   "extractions": [
@@ -153,12 +159,83 @@ Return ONLY valid JSON. Use the exact Email ID numbers from the input (e.g., 1,
 {emails_formatted}
 '''
 
+# Forced tool call: the extraction comes back as an already-parsed tool input
+_STRING = {"type": "string"}
+EXTRACT_TOOL = {
+    "name": "extract",
+    "description": "Record the entities, relationships, properties and signals extracted from each email.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "extractions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "source_id": {"type": "integer"},
+                        "nodes": {"type": "array", "items": {
+                            "type": "object",
+                            "properties": {"name": _STRING, "type": _STRING,
+                                           "context": _STRING, "speaker": _STRING},
+                            "required": ["name", "type"]
+                        }},
+                        "edges": {"type": "array", "items": {
+                            "type": "object",
+                            "properties": {"from": _STRING, "to": _STRING,
+                                           "type": _STRING, "excerpt": _STRING},
+                            "required": ["from", "to", "type"]
+                        }},
+                        "properties": {"type": "array", "items": {
+                            "type": "object",
+                            "properties": {"node": _STRING, "key": _STRING, "value": _STRING},
+                            "required": ["node", "key", "value"]
+                        }},
+                        "signals": {"type": "array", "items": {
+                            "type": "object",
+                            "properties": {"type": _STRING, "detail": _STRING},
+                            "required": ["type"]
+                        }}
+                    },
+                    "required": ["source_id", "nodes", "edges", "properties", "signals"]
+                }
+            }
+        },
+        "required": ["extractions"]
+    }
+}
+
+# Static instructions (sent as a cacheable block) and the per-batch email tail
+_PROMPT_PREFIX, _PROMPT_MARKER, _PROMPT_TAIL = HAIKU_EXTRACTION_PROMPT.partition("=== EMAILS TO PROCESS ===")
+HAIKU_PROMPT_PREFIX = _PROMPT_PREFIX.format()  # unescape {{ }}
+HAIKU_PROMPT_TAIL = _PROMPT_MARKER + _PROMPT_TAIL
+
+# Request body fields that never change, pre-encoded up to the messages value
+_PAYLOAD_PREFIX = orjson.dumps({
+    "model": "claude-3-5-haiku-20241022",
+    "max_tokens": 4096,
+    "tools": [EXTRACT_TOOL],
+    "tool_choice": {"type": "tool", "name": "extract"}
+})[:-1] + b',"messages":'
+
+
+# DB files already switched to WAL (journal_mode persists in the file)
+_WAL_INITIALIZED = set()
+
 
-def get_db_connection(db_path):
-    """Get SQLite connection"""
+def get_db_connection(db_path, check_same_thread=True):
+    """Get SQLite connection tuned for concurrent batch writers"""
     import sqlite3
-    conn = sqlite3.connect(str(db_path))
+    conn = sqlite3.connect(str(db_path), check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
+
+    if db_path not in _WAL_INITIALIZED:
+        conn.execute("PRAGMA journal_mode=WAL")
+        _WAL_INITIALIZED.add(db_path)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")  # 64 MB
+    conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
+    conn.execute("PRAGMA busy_timeout=30000")
     return conn
 
 
@@ -168,31 +245,25 @@ def get_unprocessed_emails(limit=None, resume=True):
     cursor = conn.cursor()
 
     if resume:
-        # Get emails not in audit log
-        audit_conn = get_db_connection(DB_AUDIT)
-        audit_cursor = audit_conn.cursor()
-
-        # Get processed email IDs
-        audit_cursor.execute("""
-            SELECT DISTINCT target_id
-            FROM evidence_chain
-            WHERE target_type = 'email'
-            AND action = 'batch_extracted'
+        # Filter out emails already in the audit log inside SQLite
+        cursor.execute("ATTACH DATABASE ? AS audit", (str(DB_AUDIT),))
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS audit.idx_evidence_chain_target
+            ON evidence_chain(target_type, action, target_id)
         """)
-        processed_ids = {row[0] for row in audit_cursor.fetchall()}
-        audit_conn.close()
-
-        # Get all emails
         cursor.execute("""
             SELECT doc_id, subject, date_sent, sender_email, sender_name,
                    recipients_to, recipients_cc, body_text
-            FROM emails
+            FROM emails e
+            WHERE NOT EXISTS (
+                SELECT 1 FROM audit.evidence_chain a
+                WHERE a.target_type = 'email'
+                AND a.action = 'batch_extracted'
+                AND a.target_id = e.doc_id
+            )
             ORDER BY doc_id
-        """)
-        all_emails = cursor.fetchall()
-
-        # Filter out processed
-        emails = [e for e in all_emails if e['doc_id'] not in processed_ids]
+            LIMIT ?
+        """, (limit or -1,))
     else:
         # Get all emails
         cursor.execute("""
@@ -200,24 +271,34 @@ def get_unprocessed_emails(limit=None, resume=True):
                    recipients_to, recipients_cc, body_text
             FROM emails
             ORDER BY doc_id
-        """)
-        emails = cursor.fetchall()
+            LIMIT ?
+        """, (limit or -1,))
 
+    emails = [dict(e) for e in cursor.fetchall()]
     conn.close()
 
-    if limit:
-        emails = emails[:limit]
+    # Render prompt chunks once up front; retries reuse them
+    for email in emails:
+        format_email_for_prompt(email)
 
-    return [dict(e) for e in emails]
+    return emails
 
 
 def format_email_for_prompt(email: Dict[str, Any]) -> str:
-    """Format single email for Haiku prompt"""
+    """Format single email for Haiku prompt, cached on the email dict for retries"""
+    chunk = email.get('_prompt_chunk')
+    if chunk is None:
+        chunk = email['_prompt_chunk'] = _render_email_for_prompt(email)
+    return chunk
+
+
+def _render_email_for_prompt(email: Dict[str, Any]) -> str:
+    """Render the prompt chunk for one email"""
     recipients = []
 
     if email.get('recipients_to'):
         try:
-            to_list = json.loads(email['recipients_to']) if isinstance(email['recipients_to'], str) else email['recipients_to']
+            to_list = orjson.loads(email['recipients_to']) if isinstance(email['recipients_to'], str) else email['recipients_to']
             for r in to_list:
                 if isinstance(r, dict):
                     recipients.append(r.get('email', str(r)))
@@ -228,7 +309,7 @@ def format_email_for_prompt(email: Dict[str, Any]) -> str:
 
     if email.get('recipients_cc'):
         try:
-            cc_list = json.loads(email['recipients_cc']) if isinstance(email['recipients_cc'], str) else email['recipients_cc']
+            cc_list = orjson.loads(email['recipients_cc']) if isinstance(email['recipients_cc'], str) else email['recipients_cc']
             for r in cc_list:
                 if isinstance(r, dict):
                     recipients.append(f"{r.get('email', str(r))} (cc)")
@@ -255,57 +336,35 @@ Body:
 """
 
 
-async def call_haiku_extract(emails_batch: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Call Haiku API with extraction prompt"""
+async def call_haiku_extract(session: aiohttp.ClientSession, emails_batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Call Haiku API with extraction prompt over the shared session"""
     if not HAIKU_API_KEY:
         raise ValueError("ANTHROPIC_API_KEY not set")
 
     # Format emails for prompt
     emails_formatted = "\n".join([format_email_for_prompt(e) for e in emails_batch])
 
-    prompt = HAIKU_EXTRACTION_PROMPT.format(emails_formatted=emails_formatted)
+    emails_prompt = HAIKU_PROMPT_TAIL.format(emails_formatted=emails_formatted)
+
+    # Identical on every attempt, so encode it once; only the messages
+    # are serialized per batch
+    body = _PAYLOAD_PREFIX + orjson.dumps([{"role": "user", "content": [
+        # Same instructions on every call: let the API cache them
+        {"type": "text", "text": HAIKU_PROMPT_PREFIX,
+         "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": emails_prompt}
+    ]}]) + b"}"
 
     for attempt in range(MAX_RETRIES):
         try:
-            async with httpx.AsyncClient(timeout=180.0) as client:
-                response = await client.post(
-                    "https://api.anthropic.com/v1/messages",
-                    headers={
-                        "x-api-key": HAIKU_API_KEY,
-                        "anthropic-version": "2023-06-01",
-                        "content-type": "application/json"
-                    },
-                    json={
-                        "model": "claude-3-5-haiku-20241022",
-                        "max_tokens": 4096,
-                        "messages": [{"role": "user", "content": prompt}]
-                    }
-                )
-
+            async with session.post("https://api.anthropic.com/v1/messages", data=body) as response:
                 # Check for rate limiting
-                if response.status_code == 429:
+                if response.status == 429:
                     raise RateLimitError("API rate limit exceeded (429)")
 
                 response.raise_for_status()
-                data = response.json()
-
-                content = data.get("content", [])
-                usage = data.get("usage", {})
-
-                if content and isinstance(content, list):
-                    text = content[0].get("text", "")
-
-                    tokens_in = usage.get("input_tokens", 0)
-                    tokens_out = usage.get("output_tokens", 0)
-                    cost_usd = (tokens_in * 0.80 / 1_000_000) + (tokens_out * 4.00 / 1_000_000)
-
-                    return {
-                        "text": text,
-                        "usage": usage,
-                        "cost_usd": cost_usd
-                    }
-
-                return {"error": "Invalid response format"}
+                data = await response.json(loads=orjson.loads)
+            break
 
         except RateLimitError:
             # Reraise rate limit errors immediately
@@ -313,11 +372,49 @@ async def call_haiku_extract(emails_batch: List[Dict[str, Any]]) -> Dict[str, An
         except Exception as e:
             if attempt < MAX_RETRIES - 1:
                 print(f"  ⚠ Retry {attempt + 1}/{MAX_RETRIES} after error: {e}")
-                await asyncio.sleep(2 ** attempt)  # Exponential backoff
+                # Exponential backoff, jittered so failed batches don't retry in lockstep
+                await asyncio.sleep(2 ** attempt + random.uniform(0, 0.5))
             else:
                 return {"error": f"Failed after {MAX_RETRIES} attempts: {e}"}
 
-    return {"error": "Unknown error"}
+    content = data.get("content", [])
+    usage = data.get("usage", {})
+
+    if not content or not isinstance(content, list):
+        return {"error": "Invalid response format"}
+
+    tokens_in = usage.get("input_tokens", 0)
+    tokens_out = usage.get("output_tokens", 0)
+    cache_write = usage.get("cache_creation_input_tokens", 0)
+    cache_read = usage.get("cache_read_input_tokens", 0)
+    cost_usd = (
+        (tokens_in * 0.80 / 1_000_000)
+        + (cache_write * 1.00 / 1_000_000)
+        + (cache_read * 0.08 / 1_000_000)
+        + (tokens_out * 4.00 / 1_000_000)
+    )
+
+    result = {"usage": usage, "cost_usd": cost_usd}
+
+    # Forced tool call; fall back to JSON in a text block
+    tool_input = next(
+        (b.get("input") for b in content if b.get("type") == "tool_use"), None
+    )
+    if isinstance(tool_input, dict):
+        result["data"] = tool_input
+    else:
+        result["text"] = content[0].get("text", "")
+
+    return result
+
+
+async def warm_up(session: aiohttp.ClientSession):
+    """Open one connection to the API (DNS + TCP + TLS) before the workers start"""
+    try:
+        async with session.get("https://api.anthropic.com/") as response:
+            await response.read()
+    except Exception as e:
+        print(f"  ⚠ Connection warm-up failed: {e}")
 
 
 def safe_db_value(value: Any) -> str:
@@ -328,22 +425,68 @@ def safe_db_value(value: Any) -> str:
         return value
     if isinstance(value, (list, dict)):
         # Convert complex types to JSON string
-        return json.dumps(value)
+        return orjson.dumps(value).decode()
     return str(value)
 
 
+def _clean_node(node: Dict[str, Any]) -> Tuple[str, str, str, str, str]:
+    """(name, type, name_normalized, context, speaker) for one extracted node"""
+    name = safe_db_value(node.get('name'))
+    return (
+        name,
+        safe_db_value(node.get('type', 'unknown')),
+        name.lower().strip(),
+        safe_db_value(node.get('context', '')),
+        safe_db_value(node.get('speaker', ''))
+    )
+
+
+def _clean_edge(edge: Dict[str, Any]) -> Tuple[str, str, str, str]:
+    """(from, to, type, excerpt) for one extracted edge"""
+    return (
+        safe_db_value(edge.get('from')),
+        safe_db_value(edge.get('to')),
+        safe_db_value(edge.get('type', 'related_to')),
+        safe_db_value(edge.get('excerpt', ''))
+    )
+
+
+def _clean_property(prop: Dict[str, Any]) -> Tuple[str, str, str]:
+    """(node, key, value) for one extracted property"""
+    return (
+        safe_db_value(prop.get('node')),
+        safe_db_value(prop.get('key')),
+        safe_db_value(prop.get('value'))
+    )
+
+
+def _clean_signal(signal: Dict[str, Any]) -> Tuple[str, str]:
+    """(type, detail) for one extracted signal"""
+    return (
+        safe_db_value(signal.get('type', 'unknown')),
+        safe_db_value(signal.get('detail', ''))
+    )
+
+
+# Markdown fence lines (```json, ```) wrapped around the model's JSON
+_FENCE_LINE_RE = re.compile(r"^```[^\n]*(?:\n|$)", re.MULTILINE)
+
+
 def parse_extraction_result(result: Dict[str, Any], source_ids: List[int]) -> Tuple[Dict[str, Any], str]:
     """Parse Haiku JSON response, handle errors"""
     if "error" in result:
         return None, result["error"]
 
+    # Tool-use responses are already structured
+    if "data" in result:
+        return result["data"], None
+
     try:
         text = result.get("text", "").strip()
 
         # Remove markdown code fences if present
         if text.startswith("```"):
-            lines = text.split("\n")
-            text = "\n".join([l for l in lines if not l.startswith("```")])
+            text = _FENCE_LINE_RE.sub("", text)
 
         # Try to find JSON in response
         json_start = text.find("{")
@@ -351,97 +494,102 @@ def parse_extraction_result(result: Dict[str, Any], source_ids: List[int]) -> Tu
 
         if json_start >= 0 and json_end > json_start:
             json_text = text[json_start:json_end]
-            data = json.loads(json_text)
+            data = orjson.loads(json_text)
             return data, None
         else:
             return None, "No JSON found in response"
 
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         return None, f"JSON parse error: {e}"
     except Exception as e:
         return None, f"Parse error: {e}"
 
 
-def insert_nodes(nodes: List[Dict[str, Any]], source_id: int, dry_run: bool = False) -> Dict[str, int]:
-    """Insert nodes into graph.db with dedup, return name -> node_id map"""
+# Node ids already resolved in graph.db, shared across batches (only db_writer
+# touches it). Common entities then skip the lookup query entirely.
+_NODE_ID_CACHE: Dict[Tuple[str, str], int] = {}
+
+
+def _cache_node_ids(node_ids: Dict[Tuple[str, str], int]):
+    """Remember resolved node ids, dropping the oldest 10% when full"""
+    _NODE_ID_CACHE.update(node_ids)
+    if len(_NODE_ID_CACHE) > NODE_CACHE_MAX:
+        for key in list(itertools.islice(_NODE_ID_CACHE, NODE_CACHE_MAX // 10)):
+            del _NODE_ID_CACHE[key]
+
+
+def insert_nodes(conn, nodes: List[Dict[str, Any]], source_id: int, dry_run: bool = False) -> Dict[str, int]:
+    """Insert nodes into graph.db with dedup, return name -> node_id map
+
+    Uses the caller's graph.db connection; the caller commits.
+    """
     if dry_run:
         print(f"    [DRY-RUN] Would insert {len(nodes)} nodes")
         # Return fake IDs for dry run
-        return {safe_db_value(node.get('name', '')): i for i, node in enumerate(nodes, 1)}
+        return {_clean_node(node)[0]: i for i, node in enumerate(nodes, 1)}
 
-    conn = get_db_connection(DB_GRAPH)
     cursor = conn.cursor()
 
-    node_id_map = {}
-
-    for node in nodes:
-        name = safe_db_value(node.get('name'))
-        node_type = safe_db_value(node.get('type', 'unknown'))
-        context = safe_db_value(node.get('context', ''))
-        speaker = safe_db_value(node.get('speaker', ''))
-
-        if not name:
-            continue
-
-        # Normalize name
-        name_normalized = name.lower().strip()
+    rows = [row for row in map(_clean_node, nodes) if row[0]]
+
+    # Resolve every (name, type) from the cache, then the rest from graph.db
+    # with one query per chunk
+    keys = list(dict.fromkeys((name, node_type) for name, node_type, _, _, _ in rows))
+    node_ids = {key: _NODE_ID_CACHE[key] for key in keys if key in _NODE_ID_CACHE}
+    missing = [key for key in keys if key not in node_ids]
+    for i in range(0, len(missing), NODE_LOOKUP_CHUNK):
+        chunk = missing[i:i + NODE_LOOKUP_CHUNK]
+        cursor.execute(f"""
+            WITH wanted(name, type) AS (VALUES {', '.join(['(?, ?)'] * len(chunk))})
+            SELECT n.name, n.type, MIN(n.id) AS id
+            FROM wanted JOIN nodes n ON n.name = wanted.name AND n.type = wanted.type
+            GROUP BY n.name, n.type
+        """, [value for key in chunk for value in key])
+        node_ids.update(((row['name'], row['type']), row['id']) for row in cursor.fetchall())
 
-        # Check if node exists
-        cursor.execute("""
-            SELECT id FROM nodes
-            WHERE name = ? AND type = ?
-        """, (name, node_type))
+    node_id_map = {}
+    prop_rows = []
 
-        existing = cursor.fetchone()
+    for name, node_type, name_normalized, context, speaker in rows:
+        node_id = node_ids.get((name, node_type))
 
-        if existing:
-            node_id = existing['id']
-        else:
+        if node_id is None:
             # Insert new node
             cursor.execute("""
                 INSERT INTO nodes (type, name, name_normalized, source_db, source_id, created_by)
                 VALUES (?, ?, ?, 'sources', ?, 'haiku_extract')
             """, (node_type, name, name_normalized, source_id))
-            node_id = cursor.lastrowid
+            node_id = node_ids[(name, node_type)] = cursor.lastrowid
 
         node_id_map[name] = node_id
 
         # Add context/speaker as properties if present
         if context:
-            cursor.execute("""
-                INSERT INTO properties (node_id, key, value, source_node_id, created_by)
-                VALUES (?, 'context', ?, ?, 'haiku_extract')
-            """, (node_id, context, source_id))
-
+            prop_rows.append((node_id, 'context', context, source_id))
         if speaker:
-            cursor.execute("""
-                INSERT INTO properties (node_id, key, value, source_node_id, created_by)
-                VALUES (?, 'speaker', ?, ?, 'haiku_extract')
-            """, (node_id, speaker, source_id))
+            prop_rows.append((node_id, 'speaker', speaker, source_id))
 
-    conn.commit()
-    conn.close()
+    cursor.executemany("""
+        INSERT INTO properties (node_id, key, value, source_node_id, created_by)
+        VALUES (?, ?, ?, ?, 'haiku_extract')
+    """, prop_rows)
+
+    _cache_node_ids(node_ids)
 
     return node_id_map
 
 
-def insert_edges(edges: List[Dict[str, Any]], node_id_map: Dict[str, int], source_id: int, dry_run: bool = False) -> int:
-    """Insert edges, lookup node IDs"""
+def insert_edges(conn, edges: List[Dict[str, Any]], node_id_map: Dict[str, int], source_id: int, dry_run: bool = False) -> int:
+    """Insert edges, lookup node IDs (caller commits)"""
     if dry_run:
         print(f"    [DRY-RUN] Would insert {len(edges)} edges")
         return len(edges)
 
-    conn = get_db_connection(DB_GRAPH)
     cursor = conn.cursor()
 
-    inserted = 0
-
-    for edge in edges:
-        from_name = safe_db_value(edge.get('from'))
-        to_name = safe_db_value(edge.get('to'))
-        edge_type = safe_db_value(edge.get('type', 'related_to'))
-        excerpt = safe_db_value(edge.get('excerpt', ''))
+    edge_rows = []
 
+    for from_name, to_name, edge_type, excerpt in map(_clean_edge, edges):
         if not from_name or not to_name:
             continue
 
@@ -451,54 +599,44 @@ def insert_edges(edges: List[Dict[str, Any]], node_id_map: Dict[str, int], sourc
         if not from_id or not to_id:
             # Create missing nodes
             if not from_id:
-                from_name_norm = from_name.lower().strip() if isinstance(from_name, str) else str(from_name).lower().strip()
                 cursor.execute("""
                     INSERT INTO nodes (type, name, name_normalized, source_db, source_id, created_by)
                     VALUES ('unknown', ?, ?, 'sources', ?, 'haiku_extract')
-                """, (from_name, from_name_norm, source_id))
+                """, (from_name, from_name.lower().strip(), source_id))
                 from_id = cursor.lastrowid
                 node_id_map[from_name] = from_id
 
             if not to_id:
-                to_name_norm = to_name.lower().strip() if isinstance(to_name, str) else str(to_name).lower().strip()
                 cursor.execute("""
                     INSERT INTO nodes (type, name, name_normalized, source_db, source_id, created_by)
                     VALUES ('unknown', ?, ?, 'sources', ?, 'haiku_extract')
-                """, (to_name, to_name_norm, source_id))
+                """, (to_name, to_name.lower().strip(), source_id))
                 to_id = cursor.lastrowid
                 node_id_map[to_name] = to_id
 
-        # Insert edge (skip if duplicate)
-        cursor.execute("""
-            INSERT OR IGNORE INTO edges (from_node_id, to_node_id, type, directed, source_node_id, excerpt, created_by)
-            VALUES (?, ?, ?, 1, ?, ?, 'haiku_extract')
-        """, (from_id, to_id, edge_type, source_id, excerpt))
+        edge_rows.append((from_id, to_id, edge_type, source_id, excerpt))
 
-        if cursor.rowcount > 0:
-            inserted += 1
+    if not edge_rows:
+        return 0
 
-    conn.commit()
-    conn.close()
+    # Insert edges (skip duplicates); rowcount sums over all rows
+    cursor.executemany("""
+        INSERT OR IGNORE INTO edges (from_node_id, to_node_id, type, directed, source_node_id, excerpt, created_by)
+        VALUES (?, ?, ?, 1, ?, ?, 'haiku_extract')
+    """, edge_rows)
 
-    return inserted
+    return cursor.rowcount
 
 
-def insert_properties(properties: List[Dict[str, Any]], node_id_map: Dict[str, int], source_id: int, dry_run: bool = False) -> int:
-    """Insert properties"""
+def insert_properties(conn, properties: List[Dict[str, Any]], node_id_map: Dict[str, int], source_id: int, dry_run: bool = False) -> int:
+    """Insert properties (caller commits)"""
     if dry_run:
         print(f"    [DRY-RUN] Would insert {len(properties)} properties")
         return len(properties)
 
-    conn = get_db_connection(DB_GRAPH)
-    cursor = conn.cursor()
-
-    inserted = 0
-
-    for prop in properties:
-        node_name = safe_db_value(prop.get('node'))
-        key = safe_db_value(prop.get('key'))
-        value = safe_db_value(prop.get('value'))
+    prop_rows = []
 
+    for node_name, key, value in map(_clean_property, properties):
         if not node_name or not key or not value:
             continue
 
@@ -506,56 +644,39 @@ def insert_properties(properties: List[Dict[str, Any]], node_id_map: Dict[str, i
         if not node_id:
             continue
 
-        cursor.execute("""
-            INSERT INTO properties (node_id, key, value, source_node_id, created_by)
-            VALUES (?, ?, ?, ?, 'haiku_extract')
-        """, (node_id, key, value, source_id))
-
-        inserted += 1
+        prop_rows.append((node_id, key, value, source_id))
 
-    conn.commit()
-    conn.close()
+    conn.executemany("""
+        INSERT INTO properties (node_id, key, value, source_node_id, created_by)
+        VALUES (?, ?, ?, ?, 'haiku_extract')
+    """, prop_rows)
 
-    return inserted
+    return len(prop_rows)
 
 
-def insert_signals(signals: List[Dict[str, Any]], source_id: int, dry_run: bool = False) -> int:
-    """Insert signals as flags in scores.db"""
+def insert_signals(conn, signals: List[Dict[str, Any]], source_id: int, dry_run: bool = False) -> int:
+    """Insert signals as flags in scores.db (caller commits)"""
     if dry_run:
         print(f"    [DRY-RUN] Would insert {len(signals)} signal flags")
         return len(signals)
 
-    conn = get_db_connection(DB_SCORES)
-    cursor = conn.cursor()
-
-    inserted = 0
-
-    for signal in signals:
-        signal_type = safe_db_value(signal.get('type', 'unknown'))
-        detail = safe_db_value(signal.get('detail', ''))
+    conn.executemany("""
+        INSERT INTO flags (target_type, target_id, flag_type, description, severity, source_node_id, created_by)
+        VALUES ('email', ?, ?, ?, 0, ?, 'haiku_extract')
+    """, [
+        (source_id, signal_type, detail, source_id)
+        for signal_type, detail in map(_clean_signal, signals)
+    ])
 
-        cursor.execute("""
-            INSERT INTO flags (target_type, target_id, flag_type, description, severity, source_node_id, created_by)
-            VALUES ('email', ?, ?, ?, 0, ?, 'haiku_extract')
-        """, (source_id, signal_type, detail, source_id))
-
-        inserted += 1
-
-    conn.commit()
-    conn.close()
+    return len(signals)
 
-    return inserted
 
-
-def log_extraction(source_id: int, stats: Dict[str, Any], dry_run: bool = False):
-    """Log to audit.db evidence_chain"""
+def log_extraction(conn, source_id: int, stats: Dict[str, Any], dry_run: bool = False):
+    """Log to audit.db evidence_chain (caller commits)"""
     if dry_run:
         return
 
-    conn = get_db_connection(DB_AUDIT)
-    cursor = conn.cursor()
-
-    cursor.execute("""
+    conn.execute("""
         INSERT INTO evidence_chain (
             target_type, target_id, action, new_value, reason, created_by
         ) VALUES (?, ?, ?, ?, ?, ?)
@@ -563,23 +684,17 @@ def log_extraction(source_id: int, stats: Dict[str, Any], dry_run: bool = False)
         'email',
         source_id,
         'batch_extracted',
-        json.dumps(stats),
+        orjson.dumps(stats).decode(),
         'Haiku extraction completed',
         'haiku_extract'
     ))
 
-    conn.commit()
-    conn.close()
-
 
-async def process_batch(emails: List[Dict[str, Any]], dry_run: bool = False) -> Dict[str, Any]:
-    """Process one batch of emails"""
+async def process_batch(session: aiohttp.ClientSession, emails: List[Dict[str, Any]],
+                        write_queue: asyncio.Queue, dry_run: bool = False) -> Dict[str, Any]:
+    """Process one batch of emails: call Haiku and queue the extractions for db_writer"""
     batch_stats = {
         'emails': len(emails),
-        'nodes': 0,
-        'edges': 0,
-        'properties': 0,
-        'signals': 0,
         'cost_usd': 0.0,
         'tokens_in': 0,
         'tokens_out': 0,
@@ -589,7 +704,7 @@ async def process_batch(emails: List[Dict[str, Any]], dry_run: bool = False) ->
     print(f"\n  Processing batch of {len(emails)} emails (IDs: {[e['doc_id'] for e in emails]})")
 
     # Call Haiku
-    result = await call_haiku_extract(emails)
+    result = await call_haiku_extract(session, emails)
 
     if "error" in result:
         print(f"  ✗ Error: {result['error']}")
@@ -618,6 +733,7 @@ async def process_batch(emails: List[Dict[str, Any]], dry_run: bool = False) ->
         print(f"  ⚠ No extractions found in response")
         return batch_stats
 
+    queued = []
     for extraction in extractions:
         source_id = extraction.get('source_id')
 
@@ -636,28 +752,110 @@ async def process_batch(emails: List[Dict[str, Any]], dry_run: bool = False) ->
             print(f"      [DRY-RUN] Sample nodes: {nodes[:3]}")
             print(f"      [DRY-RUN] Sample edges: {edges[:3]}")
 
-        # Insert
-        node_id_map = insert_nodes(nodes, source_id, dry_run)
-        edges_count = insert_edges(edges, node_id_map, source_id, dry_run)
-        props_count = insert_properties(properties, node_id_map, source_id, dry_run)
-        signals_count = insert_signals(signals, source_id, dry_run)
-
-        batch_stats['nodes'] += len(nodes)
-        batch_stats['edges'] += edges_count
-        batch_stats['properties'] += props_count
-        batch_stats['signals'] += signals_count
-
-        # Log extraction
-        log_extraction(source_id, {
-            'nodes': len(nodes),
-            'edges': edges_count,
-            'properties': props_count,
-            'signals': signals_count
-        }, dry_run)
+        queued.append((source_id, nodes, edges, properties, signals))
+
+    # Hand off to the DB writer; node/edge/property/signal counts are
+    # added to the run totals by db_writer once they are committed
+    if queued:
+        await write_queue.put(queued)
 
     return batch_stats
 
 
+def write_extractions(graph_conn, scores_conn, audit_conn, items: List[list], dry_run: bool = False) -> Dict[str, int]:
+    """Write drained batches and commit once per DB, audit.db last
+
+    Rolls everything back on error. Returns the node/edge/property/signal
+    counts written.
+    """
+    written = {'nodes': 0, 'edges': 0, 'properties': 0, 'signals': 0}
+    try:
+        for queued in items:
+            for source_id, nodes, edges, properties, signals in queued:
+                node_id_map = insert_nodes(graph_conn, nodes, source_id, dry_run)
+                edges_count = insert_edges(graph_conn, edges, node_id_map, source_id, dry_run)
+                props_count = insert_properties(graph_conn, properties, node_id_map, source_id, dry_run)
+                signals_count = insert_signals(scores_conn, signals, source_id, dry_run)
+
+                written['nodes'] += len(nodes)
+                written['edges'] += edges_count
+                written['properties'] += props_count
+                written['signals'] += signals_count
+
+                # Log extraction
+                log_extraction(audit_conn, source_id, {
+                    'nodes': len(nodes),
+                    'edges': edges_count,
+                    'properties': props_count,
+                    'signals': signals_count
+                }, dry_run)
+
+        if not dry_run:
+            graph_conn.commit()
+            scores_conn.commit()
+            audit_conn.commit()
+    except Exception:
+        for conn in (graph_conn, scores_conn, audit_conn):
+            if conn is not None:
+                conn.rollback()
+        # Ids inserted by the rolled-back transaction no longer exist
+        _NODE_ID_CACHE.clear()
+        raise
+
+    return written
+
+
+async def db_writer(write_queue: asyncio.Queue, total_stats: Dict[str, Any], dry_run: bool = False):
+    """Single SQLite writer for all batches
+
+    SQLite allows one writer per file, so API workers queue their parsed
+    extractions here instead of contending for the lock. Whatever is queued
+    is drained (up to WRITER_DRAIN batches) and committed as one transaction
+    per DB, audit.db last so emails are only marked extracted once their
+    data is in. A None sentinel stops the writer.
+    """
+    graph_conn = scores_conn = audit_conn = None
+    if not dry_run:
+        # Used from to_thread workers, but only by one drain at a time
+        graph_conn = get_db_connection(DB_GRAPH, check_same_thread=False)
+        scores_conn = get_db_connection(DB_SCORES, check_same_thread=False)
+        audit_conn = get_db_connection(DB_AUDIT, check_same_thread=False)
+        # Node lookups are by (name, type)
+        graph_conn.execute("CREATE INDEX IF NOT EXISTS idx_nodes_name_type ON nodes(name, type)")
+        graph_conn.commit()
+
+    try:
+        done = False
+        while not done:
+            items = [await write_queue.get()]
+            while len(items) < WRITER_DRAIN and not write_queue.empty():
+                items.append(write_queue.get_nowait())
+            if items[-1] is None:
+                done = True
+                items.pop()
+            if not items:
+                continue
+
+            # Run the SQLite work in a thread so the event loop keeps
+            # servicing in-flight API responses meanwhile
+            try:
+                written = await asyncio.to_thread(
+                    write_extractions, graph_conn, scores_conn, audit_conn, items, dry_run
+                )
+            except Exception as e:
+                error_msg = f"DB write failed for {len(items)} batches: {e}"
+                total_stats['errors'].append(error_msg)
+                print(f"  ✗ {error_msg}")
+                continue
+
+            for key, count in written.items():
+                total_stats[key] += count
+    finally:
+        for conn in (graph_conn, scores_conn, audit_conn):
+            if conn is not None:
+                conn.close()
+
+
 async def main(limit=None, dry_run=False, resume=True, batch_size=BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY):
     """Main extraction loop with parallel processing"""
     print("=" * 80)
@@ -677,16 +875,14 @@ async def main(limit=None, dry_run=False, resume=True, batch_size=BATCH_SIZE, co
 
     print(f"✓ Found {len(emails)} emails to process")
 
-    # Split into batches
-    batches = [emails[i:i + batch_size] for i in range(0, len(emails), batch_size)]
-    print(f"✓ Split into {len(batches)} batches of {batch_size}")
+    # Batches are sliced lazily by the producer below
+    total_batches = (len(emails) + batch_size - 1) // batch_size
+    print(f"✓ Split into {total_batches} batches of {batch_size}")
     print(f"✓ Processing with concurrency = {concurrency}")
 
     # Shared state for parallel processing
-    semaphore = asyncio.Semaphore(concurrency)
     progress_lock = asyncio.Lock()
     completed_count = 0
-    total_batches = len(batches)
 
     # Shared stats
     total_stats = {
@@ -702,61 +898,48 @@ async def main(limit=None, dry_run=False, resume=True, batch_size=BATCH_SIZE, co
     }
     stats_lock = asyncio.Lock()
 
-    async def process_batch_with_semaphore(batch_idx: int, batch: List[Dict[str, Any]]):
-        """Process batch with semaphore control and progress tracking"""
-        nonlocal completed_count
-
-        async with semaphore:
-            # Show progress
-            async with progress_lock:
-                print(f"\n[Batch {batch_idx + 1}/{total_batches}] Starting (IDs: {[e['doc_id'] for e in batch]})")
+    # All SQLite writes go through one writer task
+    write_queue = asyncio.Queue()
+    writer_task = asyncio.create_task(db_writer(write_queue, total_stats, dry_run))
 
-            # Process with retry on rate limit
-            max_rate_limit_retries = 3
-            for retry in range(max_rate_limit_retries):
-                try:
-                    batch_stats = await process_batch(batch, dry_run)
+    async def process_batch_with_retry(session: aiohttp.ClientSession, batch_idx: int, batch: List[Dict[str, Any]]):
+        """Process batch with rate-limit retries and progress tracking"""
+        nonlocal completed_count
 
-                    # Update shared stats
-                    async with stats_lock:
-                        total_stats['emails'] += batch_stats['emails']
-                        total_stats['nodes'] += batch_stats['nodes']
-                        total_stats['edges'] += batch_stats['edges']
-                        total_stats['properties'] += batch_stats['properties']
-                        total_stats['signals'] += batch_stats['signals']
-                        total_stats['cost_usd'] += batch_stats['cost_usd']
-                        total_stats['tokens_in'] += batch_stats['tokens_in']
-                        total_stats['tokens_out'] += batch_stats['tokens_out']
-                        total_stats['errors'].extend(batch_stats['errors'])
-
-                    # Update progress
+        # Show progress
+        async with progress_lock:
+            print(f"\n[Batch {batch_idx + 1}/{total_batches}] Starting (IDs: {[e['doc_id'] for e in batch]})")
+
+        # Process with retry on rate limit
+        max_rate_limit_retries = 3
+        for retry in range(max_rate_limit_retries):
+            try:
+                batch_stats = await process_batch(session, batch, write_queue, dry_run)
+
+                # Update shared stats
+                async with stats_lock:
+                    total_stats['emails'] += batch_stats['emails']
+                    total_stats['cost_usd'] += batch_stats['cost_usd']
+                    total_stats['tokens_in'] += batch_stats['tokens_in']
+                    total_stats['tokens_out'] += batch_stats['tokens_out']
+                    total_stats['errors'].extend(batch_stats['errors'])
+
+                # Update progress
+                async with progress_lock:
+                    completed_count += 1
+                    print(f"  ✓ Batch {batch_idx + 1}/{total_batches} complete ({completed_count}/{total_batches} total)")
+
+                return batch_stats
+
+            except RateLimitError as e:
+                if retry < max_rate_limit_retries - 1:
+                    backoff = 2 ** (retry + 1)  # 2, 4, 8 seconds
                     async with progress_lock:
-                        completed_count += 1
-                        print(f"  ✓ Batch {batch_idx + 1}/{total_batches} complete ({completed_count}/{total_batches} total)")
-
-                    return batch_stats
-
-                except RateLimitError as e:
-                    if retry < max_rate_limit_retries - 1:
-                        backoff = 2 ** (retry + 1)  # 2, 4, 8 seconds
-                        async with progress_lock:
-                            print(f"  ⚠ Rate limit hit on batch {batch_idx + 1}, waiting {backoff}s before retry {retry + 1}/{max_rate_limit_retries}")
-                        await asyncio.sleep(backoff)
-                    else:
-                        # Log error and return empty stats
-                        error_msg = f"Rate limit exceeded after {max_rate_limit_retries} retries: {e}"
-                        async with stats_lock:
-                            total_stats['errors'].append(error_msg)
-                        async with progress_lock:
-                            print(f"  ✗ Batch {batch_idx + 1} failed: {error_msg}")
-                        return {
-                            'emails': 0, 'nodes': 0, 'edges': 0, 'properties': 0,
-                            'signals': 0, 'cost_usd': 0.0, 'tokens_in': 0,
-                            'tokens_out': 0, 'errors': [error_msg]
-                        }
-                except Exception as e:
-                    # Handle other exceptions
-                    error_msg = f"Unexpected error in batch {batch_idx + 1}: {e}"
+                        print(f"  ⚠ Rate limit hit on batch {batch_idx + 1}, waiting {backoff}s before retry {retry + 1}/{max_rate_limit_retries}")
+                    await asyncio.sleep(backoff)
+                else:
+                    # Log error and return empty stats
+                    error_msg = f"Rate limit exceeded after {max_rate_limit_retries} retries: {e}"
                     async with stats_lock:
                         total_stats['errors'].append(error_msg)
                     async with progress_lock:
@@ -766,20 +949,65 @@ async def main(limit=None, dry_run=False, resume=True, batch_size=BATCH_SIZE, co
                         'signals': 0, 'cost_usd': 0.0, 'tokens_in': 0,
                         'tokens_out': 0, 'errors': [error_msg]
                     }
+            except Exception as e:
+                # Handle other exceptions
+                error_msg = f"Unexpected error in batch {batch_idx + 1}: {e}"
+                async with stats_lock:
+                    total_stats['errors'].append(error_msg)
+                async with progress_lock:
+                    print(f"  ✗ Batch {batch_idx + 1} failed: {error_msg}")
+                return {
+                    'emails': 0, 'nodes': 0, 'edges': 0, 'properties': 0,
+                    'signals': 0, 'cost_usd': 0.0, 'tokens_in': 0,
+                    'tokens_out': 0, 'errors': [error_msg]
+                }
+
+    # Bounded hand-off to a fixed pool of workers, so only a few batches
+    # (not one task per batch) are pending at any time
+    batch_queue = asyncio.Queue(maxsize=concurrency * 4)
+
+    async def produce_batches():
+        for batch_idx, i in enumerate(range(0, len(emails), batch_size)):
+            await batch_queue.put((batch_idx, emails[i:i + batch_size]))
+        for _ in range(concurrency):
+            await batch_queue.put(None)
+
+    async def worker(session: aiohttp.ClientSession):
+        while (item := await batch_queue.get()) is not None:
+            batch_idx, batch = item
+            try:
+                await process_batch_with_retry(session, batch_idx, batch)
+            except Exception as e:
+                error_msg = f"Fatal error in batch {batch_idx + 1}: {e}"
+                total_stats['errors'].append(error_msg)
+                print(f"\n✗ {error_msg}")
 
     start_time = time.time()
 
     # Process all batches in parallel
     print(f"\nProcessing {total_batches} batches in parallel...")
-    tasks = [process_batch_with_semaphore(i, batch) for i, batch in enumerate(batches)]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    # Handle any uncaught exceptions
-    for i, result in enumerate(results):
-        if isinstance(result, Exception):
-            error_msg = f"Fatal error in batch {i + 1}: {result}"
-            total_stats['errors'].append(error_msg)
-            print(f"\n✗ {error_msg}")
+    # One keep-alive session for every Haiku call, sized to the concurrency
+    connector = aiohttp.TCPConnector(
+        limit=concurrency * 2,
+        limit_per_host=concurrency * 2,
+        ttl_dns_cache=600,
+        keepalive_timeout=60
+    )
+    async with aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=180),
+        headers={
+            "x-api-key": HAIKU_API_KEY,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json"
+        }
+    ) as session:
+        await warm_up(session)
+        await asyncio.gather(produce_batches(), *[worker(session) for _ in range(concurrency)])
+
+    # Let the writer commit whatever is still queued
+    await write_queue.put(None)
+    await writer_task
 
     elapsed = time.time() - start_time
 
@@ -5,12 +5,18 @@ Processes documents and extracts entities/relationships into PostgreSQL
 """
 
 import os
+import re
 import sys
 import json
 import time
-import requests
+import hashlib
+import asyncio
+import httpx
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.pool
+from contextlib import contextmanager
+from psycopg2.extras import RealDictCursor, execute_values
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 
@@ -23,6 +29,9 @@ for line in env_file.read_text().splitlines():
 
 DATABASE_URL = os.environ.get('DATABASE_URL')
 PHI3_URL = "http://127.0.0.1:8001"
+CONCURRENCY = 1  # Fallback when the Phi-3 server doesn't report its slots
+EXTRACTION_KIND = 'extract_all_phi3_v1'  # bump when the server prompt changes
+WRITE_BATCH = 16  # extracted docs per DB transaction
 
 # L's investigative extraction prompt
 L_SYSTEM_PROMPT = """You are L, the detective. Brilliant. Obsessive about truth and patterns.
@@ -39,271 +48,361 @@ Extract EVERYTHING. Every name. Every place. Every date. Every amount.
 A good detective misses nothing."""
 
 
-def get_conn():
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-
+# Map extracted entity types onto node types
+ENTITY_TYPE_MAP = {
+    'person': 'person',
+    'organization': 'organization',
+    'location': 'location',
+    'event': 'event',
+    'document': 'document',
+    'concept': 'concept',
+    'asset': 'amount',
+    'communication': 'communication',
+    'company': 'organization',
+    'date': 'date',
+    'amount': 'amount',
+    'email': 'email',
+    'phone': 'phone',
+}
+
+
+_pool = None
+
+
+def _get_pool():
+    """Get or create the connection pool (lazy initialization)"""
+    global _pool
+    if _pool is None:
+        _pool = psycopg2.pool.ThreadedConnectionPool(
+            minconn=1, maxconn=8, dsn=DATABASE_URL, cursor_factory=RealDictCursor
+        )
+    return _pool
 
-def get_unprocessed_docs(source_id=2, limit=100, offset=0):
-    """Get docs that need entity extraction"""
-    conn = get_conn()
-    cur = conn.cursor()
 
-    cur.execute("""
-        SELECT d.id, d.filename, d.doc_type,
-               LEFT(c.full_text, 2500) as text_preview
-        FROM documents d
-        JOIN contents c ON d.id = c.doc_id
-        WHERE d.source_id = %s
-        AND d.status = 'indexed'
-        ORDER BY d.id
-        LIMIT %s OFFSET %s
-    """, (source_id, limit, offset))
+@contextmanager
+def get_conn():
+    """Borrow a pooled connection; commits on success, rolls back on error"""
+    pool = _get_pool()
+    conn = pool.getconn()
+    try:
+        with conn:
+            yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def get_unprocessed_docs(source_id=2, limit=100, last_id=0):
+    """Get docs that need entity extraction, in id order after last_id"""
+    with get_conn() as conn, conn.cursor() as cur:
+        # Keyset paging instead of OFFSET, and skip docs already enriched
+        # by an earlier run
+        cur.execute("""
+            SELECT d.id, d.filename, d.doc_type,
+                   LEFT(c.full_text, 2500) as text_preview
+            FROM documents d
+            JOIN contents c ON d.id = c.doc_id
+            WHERE d.source_id = %s
+            AND d.status = 'indexed'
+            AND d.id > %s
+            AND NOT EXISTS (
+                SELECT 1 FROM nodes n
+                WHERE n.source_id = d.id AND n.created_by = 'phi3_enrich'
+            )
+            ORDER BY d.id
+            LIMIT %s
+        """, (source_id, last_id, limit))
 
-    docs = cur.fetchall()
-    conn.close()
-    return docs
+        return cur.fetchall()
 
 
 def get_processed_count(source_id=2):
     """Count docs that have been enriched"""
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT COUNT(DISTINCT source_id)
-        FROM nodes
-        WHERE created_by = 'phi3_enrich'
-        AND source_id IN (SELECT id FROM documents WHERE source_id = %s)
-    """, (source_id,))
-    result = cur.fetchone()
-    conn.close()
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(DISTINCT source_id)
+            FROM nodes
+            WHERE created_by = 'phi3_enrich'
+            AND source_id IN (SELECT id FROM documents WHERE source_id = %s)
+        """, (source_id,))
+        result = cur.fetchone()
     return result['count'] if result else 0
 
 
+_NORM_RE = re.compile(r'[^a-z0-9\s]')
+
+
+@lru_cache(maxsize=200_000)
 def normalize_name(s):
     """Normalize entity name for deduplication"""
-    import re
-    return re.sub(r'[^a-z0-9\s]', '', s.lower()).strip()
+    return _NORM_RE.sub('', s.lower()).strip()
+
 
+async def extract_all(client, text):
+    """Call Phi-3 for entities and relationships in one generation
 
-def extract_with_phi3(text):
-    """Call Phi-3 for entity extraction"""
+    Returns (entities, relationships).
+    """
     try:
-        resp = requests.post(
-            f"{PHI3_URL}/extract/entities",
-            json={"text": text},
-            timeout=300  # 5 minutes for slow CPU inference
-        )
-        if resp.ok:
+        resp = await client.post(f"{PHI3_URL}/extract/all", json={"text": text})
+        if resp.is_success:
             data = resp.json()
-            return data.get('entities', [])
+            return data.get('entities', []), data.get('relationships', [])
         else:
             print(f"  Phi-3 HTTP {resp.status_code}")
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         print(f"  Phi-3 timeout (>300s)")
     except Exception as e:
         print(f"  Phi-3 error: {e}")
-    return []
-
-
-def extract_relationships_phi3(text):
-    """Call Phi-3 for relationship extraction"""
-    try:
-        resp = requests.post(
-            f"{PHI3_URL}/extract/relationships",
-            json={"text": text},
-            timeout=300  # 5 minutes for slow CPU inference
-        )
-        if resp.ok:
-            data = resp.json()
-            return data.get('relationships', [])
-        else:
-            print(f"  Phi-3 rel HTTP {resp.status_code}")
-    except requests.exceptions.Timeout:
-        print(f"  Phi-3 rel timeout (>300s)")
-    except Exception as e:
-        print(f"  Phi-3 rel error: {e}")
-    return []
-
-
-def save_entities(doc_id, entities):
-    """Save extracted entities to nodes table"""
-    if not entities:
+    return [], []
+
+
+def save_entities(cur, docs):
+    """Save extracted entities for several documents to nodes table
+
+    docs is a list of (doc_id, entities). A new node's source_id is the
+    first document that mentions it. Returns (nodes added,
+    {doc_id: {name_normalized: node id}}).
+    """
+    # Normalize and dedupe first, so the DB work is one lookup + one insert
+    wanted = {}
+    doc_keys = {}
+    for doc_id, entities in docs:
+        keys = doc_keys.setdefault(doc_id, [])
+        for ent in entities:
+            name = ent.get('name', '').strip()
+            etype = ent.get('type', 'unknown')
+
+            if not name or len(name) < 2:
+                continue
+
+            norm = normalize_name(name)
+            if not norm or len(norm) < 2:
+                continue
+
+            etype = ENTITY_TYPE_MAP.get(etype, etype)
+            wanted.setdefault((etype, norm), (name, doc_id))
+            keys.append((etype, norm))
+
+    if not wanted:
+        return 0, {doc_id: {} for doc_id in doc_keys}
+
+    # Check which already exist
+    existing = execute_values(cur, """
+        SELECT id, type, name_normalized FROM nodes
+        WHERE (type, name_normalized) IN (VALUES %s)
+    """, list(wanted), page_size=len(wanted), fetch=True)
+    node_ids = {(r['type'], r['name_normalized']): r['id'] for r in existing}
+
+    new_rows = [
+        (etype, name, norm, doc_id)
+        for (etype, norm), (name, doc_id) in wanted.items()
+        if (etype, norm) not in node_ids
+    ]
+    if new_rows:
+        inserted = execute_values(cur, """
+            INSERT INTO nodes (type, name, name_normalized, source_id, created_at, created_by)
+            VALUES %s
+            RETURNING id, type, name_normalized
+        """, new_rows, template="(%s, %s, %s, %s, NOW(), 'phi3_enrich')",
+            page_size=len(new_rows), fetch=True)
+        node_ids.update(((r['type'], r['name_normalized']), r['id']) for r in inserted)
+
+    entity_ids = {
+        doc_id: {norm: node_ids[(etype, norm)] for etype, norm in keys}
+        for doc_id, keys in doc_keys.items()
+    }
+    return len(new_rows), entity_ids
+
+
+def save_relationships(cur, docs):
+    """Save extracted relationships for several documents to edges table
+
+    docs is a list of (doc_id, relationships, entity_ids), entity_ids being
+    that document's {name_normalized: node id} map from save_entities.
+    """
+    # Keyed by the edges unique key, so repeated mentions become one row
+    rows = {}
+    for doc_id, relationships, entity_ids in docs:
+        for rel in relationships:
+            from_name = normalize_name(rel.get('from', ''))
+            to_name = normalize_name(rel.get('to', ''))
+            rel_type = rel.get('type', 'related_to')
+            context = rel.get('context', '')[:500]
+
+            from_id = entity_ids.get(from_name)
+            to_id = entity_ids.get(to_name)
+
+            if from_id and to_id and from_id != to_id:
+                rows.setdefault((from_id, to_id, rel_type), (from_id, to_id, rel_type, doc_id, context))
+
+    if not rows:
         return 0
 
-    conn = get_conn()
-    cur = conn.cursor()
-    added = 0
+    # edges is UNIQUE(from_node_id, to_node_id, type), so existing edges are skipped
+    inserted = execute_values(cur, """
+        INSERT INTO edges (from_node_id, to_node_id, type, source_node_id, excerpt, created_at, created_by)
+        VALUES %s
+        ON CONFLICT (from_node_id, to_node_id, type) DO NOTHING
+        RETURNING id
+    """, list(rows.values()), template="(%s, %s, %s, %s, %s, NOW(), 'phi3_enrich')",
+        page_size=len(rows), fetch=True)
 
-    for ent in entities:
-        name = ent.get('name', '').strip()
-        etype = ent.get('type', 'unknown')
-        confidence = ent.get('confidence', 50)
+    return len(inserted)
 
-        if not name or len(name) < 2:
-            continue
 
-        norm = normalize_name(name)
-        if not norm or len(norm) < 2:
-            continue
+def input_hash(doc):
+    """Cache key for the text sent to /extract/all"""
+    return hashlib.sha256((doc['text_preview'] or '').encode()).hexdigest()
 
-        # Map entity types
-        type_map = {
-            'person': 'person',
-            'organization': 'organization',
-            'location': 'location',
-            'event': 'event',
-            'document': 'document',
-            'concept': 'concept',
-            'asset': 'amount',
-            'communication': 'communication',
-            'company': 'organization',
-            'date': 'date',
-            'amount': 'amount',
-            'email': 'email',
-            'phone': 'phone',
-        }
-        etype = type_map.get(etype, etype)
-
-        # Check if exists
+
+def get_cached_extractions(hashes):
+    """Earlier /extract/all results for these input hashes, in one query"""
+    with get_conn() as conn, conn.cursor() as cur:
         cur.execute(
-            "SELECT id FROM nodes WHERE type=%s AND name_normalized=%s",
-            (etype, norm)
+            "SELECT input_hash, result FROM llm_extractions WHERE kind=%s AND input_hash = ANY(%s)",
+            (EXTRACTION_KIND, list(hashes))
+        )
+        return {r['input_hash']: r['result'] for r in cur.fetchall()}
+
+
+def write_extractions(items):
+    """Write a group of extracted documents in one transaction
+
+    items are (doc, input_hash, entities, relationships, cached). Returns
+    (nodes added, edges added).
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        # Remember fresh results so identical text isn't extracted again
+        fresh = [
+            (ihash, EXTRACTION_KIND, json.dumps({'entities': entities, 'relationships': relationships}))
+            for _, ihash, entities, relationships, cached in items
+            if entities and not cached
+        ]
+        if fresh:
+            execute_values(cur, """
+                INSERT INTO llm_extractions (input_hash, kind, result)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+            """, fresh, page_size=len(fresh))
+
+        nodes_added, entity_ids = save_entities(
+            cur, [(doc['id'], entities) for doc, _, entities, _, _ in items]
         )
-        existing = cur.fetchone()
 
-        if not existing:
-            cur.execute("""
-                INSERT INTO nodes (type, name, name_normalized, source_id, created_at, created_by)
-                VALUES (%s, %s, %s, %s, NOW(), 'phi3_enrich')
-                RETURNING id
-            """, (etype, name, norm, doc_id))
-            added += 1
+        # Save relationships (only for documents with at least two entities)
+        edges_added = save_relationships(cur, [
+            (doc['id'], relationships, entity_ids[doc['id']])
+            for doc, _, entities, relationships, _ in items
+            if len(entities) >= 2
+        ])
 
-    conn.commit()
-    conn.close()
-    return added
+    return nodes_added, edges_added
 
 
-def save_relationships(doc_id, relationships, entities):
-    """Save extracted relationships to edges table"""
-    if not relationships:
-        return 0
+async def extract_document(semaphore, client, doc, cache, write_queue):
+    """Extract one document (or take its cached result) and queue it for writing
 
-    conn = get_conn()
-    cur = conn.cursor()
-    added = 0
-
-    # Build entity name -> id map
-    entity_map = {}
-    for ent in entities:
-        name = ent.get('name', '').strip()
-        norm = normalize_name(name)
-        if norm:
-            cur.execute(
-                "SELECT id FROM nodes WHERE name_normalized=%s LIMIT 1",
-                (norm,)
-            )
-            result = cur.fetchone()
-            if result:
-                entity_map[norm] = result['id']
-
-    for rel in relationships:
-        from_name = normalize_name(rel.get('from', ''))
-        to_name = normalize_name(rel.get('to', ''))
-        rel_type = rel.get('type', 'related_to')
-        context = rel.get('context', '')[:500]
-
-        from_id = entity_map.get(from_name)
-        to_id = entity_map.get(to_name)
-
-        if from_id and to_id and from_id != to_id:
-            # Check if edge exists
-            cur.execute("""
-                SELECT id FROM edges
-                WHERE from_node_id=%s AND to_node_id=%s AND type=%s
-            """, (from_id, to_id, rel_type))
-
-            if not cur.fetchone():
-                cur.execute("""
-                    INSERT INTO edges (from_node_id, to_node_id, type, source_node_id, excerpt, created_at, created_by)
-                    VALUES (%s, %s, %s, %s, %s, NOW(), 'phi3_enrich')
-                """, (from_id, to_id, rel_type, doc_id, context))
-                added += 1
-
-    conn.commit()
-    conn.close()
-    return added
-
-
-def process_document(doc):
-    """Process a single document"""
-    doc_id = doc['id']
+    Returns (entities, relationships) found, or None if the text is too short.
+    """
     text = doc['text_preview'] or ''
 
     if len(text.strip()) < 50:
-        return 0, 0
+        return None
+
+    # Identical text (re-uploads, forwarded copies) reuses the earlier result
+    ihash = input_hash(doc)
+    cached = cache.get(ihash)
+
+    if cached:
+        entities = cached.get('entities', [])
+        relationships = cached.get('relationships', [])
+    else:
+        async with semaphore:
+            entities, relationships = await extract_all(client, text)
+
+    await write_queue.put((doc, ihash, entities, relationships, cached is not None))
+    return len(entities), len(relationships)
+
+
+async def db_writer(write_queue, totals):
+    """Write queued extractions, up to WRITE_BATCH documents per transaction
+
+    Runs alongside extraction so Phi-3 calls never wait on Postgres. A None
+    sentinel stops the writer.
+    """
+    done = False
+    while not done:
+        items = [await write_queue.get()]
+        while len(items) < WRITE_BATCH and not write_queue.empty():
+            items.append(write_queue.get_nowait())
+        if items[-1] is None:
+            done = True
+            items.pop()
+        if not items:
+            continue
 
-    # Extract entities
-    entities = extract_with_phi3(text)
-    nodes_added = save_entities(doc_id, entities)
+        # Postgres work runs in a thread so in-flight LLM calls keep going
+        try:
+            nodes, edges = await asyncio.to_thread(write_extractions, items)
+        except Exception as e:
+            print(f"  DB write failed for {len(items)} docs: {e}")
+            totals['errors'] += len(items)
+            continue
 
-    # Extract relationships (only if we have entities)
-    edges_added = 0
-    if entities and len(entities) >= 2:
-        relationships = extract_relationships_phi3(text)
-        edges_added = save_relationships(doc_id, relationships, entities)
+        totals['nodes'] += nodes
+        totals['edges'] += edges
+        print(f"  wrote {len(items)} docs: +{nodes} nodes, +{edges} edges")
 
-    return nodes_added, edges_added
 
+async def main(source_id=2, limit=10000, batch_size=10, concurrency=None):
+    """Main enrichment loop
 
-def main(source_id=2, limit=10000, batch_size=10):
-    """Main enrichment loop"""
+    concurrency defaults to the number of slots the Phi-3 server reports;
+    more than that only queues requests inside the server.
+    """
 
     print(f"=== L Investigation Graph Enrichment ===")
     print(f"Using Phi-3 local LLM at {PHI3_URL}")
     print()
 
-    # Check Phi-3 is running
-    try:
-        health = requests.get(f"{PHI3_URL}/health", timeout=5).json()
-        if not health.get('model_loaded'):
-            print("ERROR: Phi-3 model not loaded!")
-            return
-        print(f"Phi-3 status: {health}")
-    except Exception as e:
-        print(f"ERROR: Cannot connect to Phi-3: {e}")
-        return
-
-    # Get total docs
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM documents WHERE source_id=%s", (source_id,))
-    total_docs = cur.fetchone()['count']
-    conn.close()
+    totals = {'nodes': 0, 'edges': 0, 'errors': 0}
+    processed = 0
+    start_time = time.time()
 
-    print(f"Total documents in source {source_id}: {total_docs}")
-    print()
+    # 5 minutes per call for slow CPU inference
+    async with httpx.AsyncClient(timeout=httpx.Timeout(300.0, connect=5.0)) as client:
+        # Check Phi-3 is running
+        try:
+            health = (await client.get(f"{PHI3_URL}/health", timeout=5.0)).json()
+            if not health.get('model_loaded'):
+                print("ERROR: Phi-3 model not loaded!")
+                return
+            print(f"Phi-3 status: {health}")
+        except Exception as e:
+            print(f"ERROR: Cannot connect to Phi-3: {e}")
+            return
 
-    total_nodes = 0
-    total_edges = 0
-    processed = 0
-    offset = 0
+        if concurrency is None:
+            concurrency = health.get('slots') or CONCURRENCY
+        print(f"LLM concurrency: {concurrency}")
 
-    start_time = time.time()
+        # Get total docs
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM documents WHERE source_id=%s", (source_id,))
+            total_docs = cur.fetchone()['count']
 
-    while processed < limit:
-        docs = get_unprocessed_docs(source_id, batch_size, offset)
+        print(f"Total documents in source {source_id}: {total_docs}")
+        print()
 
-        if not docs:
-            break
+        semaphore = asyncio.Semaphore(concurrency)
+        write_queue = asyncio.Queue(maxsize=WRITE_BATCH * 2)
+        writer_task = asyncio.create_task(db_writer(write_queue, totals))
+        last_id = 0
 
-        for doc in docs:
-            doc_id = doc['id']
-            filename = doc['filename']
+        async def run_document(doc, cache):
+            nonlocal processed
 
-            nodes, edges = process_document(doc)
-            total_nodes += nodes
-            total_edges += edges
+            found = await extract_document(semaphore, client, doc, cache, write_queue)
             processed += 1
 
             # Progress
@@ -311,18 +410,33 @@ def main(source_id=2, limit=10000, batch_size=10):
             rate = processed / elapsed if elapsed > 0 else 0
             eta = (limit - processed) / rate if rate > 0 else 0
 
-            print(f"[{processed}/{min(limit, total_docs)}] {filename}: +{nodes} nodes, +{edges} edges (ETA: {int(eta)}s)")
+            status = "too short" if found is None else f"{found[0]} entities, {found[1]} relationships"
+            print(f"[{processed}/{min(limit, total_docs)}] {doc['filename']}: {status} (ETA: {int(eta)}s)")
+
+        try:
+            while processed < limit:
+                docs = await asyncio.to_thread(get_unprocessed_docs, source_id, batch_size, last_id)
+
+                if not docs:
+                    break
+
+                cache = await asyncio.to_thread(get_cached_extractions, {input_hash(doc) for doc in docs})
 
-        offset += batch_size
+                # The semaphore bounds how many documents are at Phi-3 at once
+                await asyncio.gather(*[run_document(doc, cache) for doc in docs])
 
-        # Small delay to not overload Phi-3
-        time.sleep(0.5)
+                last_id = docs[-1]['id']
+        finally:
+            await write_queue.put(None)
+            await writer_task
 
     elapsed = time.time() - start_time
     print()
     print(f"=== Complete ===")
     print(f"Processed: {processed} documents")
-    print(f"Added: {total_nodes} nodes, {total_edges} edges")
+    print(f"Added: {totals['nodes']} nodes, {totals['edges']} edges")
+    if totals['errors']:
+        print(f"Failed writes: {totals['errors']} documents")
     print(f"Time: {int(elapsed)}s ({processed/elapsed:.1f} docs/s)")
 
 
@@ -332,6 +446,7 @@ if __name__ == "__main__":
     parser.add_argument('--source', type=int, default=2, help='Source ID (default: 2 = epstein_vol8)')
     parser.add_argument('--limit', type=int, default=10000, help='Max docs to process')
     parser.add_argument('--batch', type=int, default=10, help='Batch size')
+    parser.add_argument('--concurrency', type=int, help='Documents in flight at Phi-3 (default: server slots)')
     args = parser.parse_args()
 
-    main(args.source, args.limit, args.batch)
+    asyncio.run(main(args.source, args.limit, args.batch, args.concurrency))
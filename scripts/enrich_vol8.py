@@ -5,13 +5,17 @@ PostgreSQL version
 """
 
 import os
+import re
 import sys
 import json
 import time
 import asyncio
+import statistics
+from collections import deque
 import httpx
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from functools import lru_cache
 from pathlib import Path
 
 # Load env
@@ -24,10 +28,23 @@ for line in env_file.read_text().splitlines():
 DATABASE_URL = os.environ.get('DATABASE_URL')
 ANTHROPIC_API_KEY = os.environ.get('ANTHROPIC_API_KEY')
 
+API_URL = "https://api.anthropic.com/v1/messages"
+API_HEADERS = {
+    "x-api-key": ANTHROPIC_API_KEY,
+    "anthropic-version": "2023-06-01",
+    "content-type": "application/json"
+}
+
 BATCH_SIZE = 5  # docs per API call
 CONCURRENCY = 10  # parallel calls
 MAX_CHARS = 3000  # chars per doc to send
 
+# Per-request timeout tracks recent latency: 1.5x the p90, so the slow
+# tail is cut and re-sent instead of holding a worker for the full minute
+TIMEOUT_DEFAULT = 60.0  # until enough latencies are recorded
+TIMEOUT_FLOOR = 10.0
+MAX_RETRIES = 2  # re-sends after a timeout
+
 EXTRACTION_PROMPT = '''Extract entities from these documents. Return JSON only.
 
 DOCUMENTS:
@@ -54,32 +71,82 @@ def get_conn():
     return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
 
 
-def get_unprocessed_docs(limit=1000):
-    """Get docs that haven't been enriched yet"""
+# Docs from source 2 (epstein_vol8) that don't have nodes yet
+# (NOT EXISTS probes idx_nodes_source_id, from db/migrate_to_age.py, per doc)
+UNPROCESSED_DOCS_SQL = """
+    SELECT d.id, d.filename, LEFT(c.full_text, %(max_chars)s) AS full_text
+    FROM documents d
+    JOIN contents c ON d.id = c.doc_id
+    WHERE d.source_id = 2
+    AND NOT EXISTS (
+        SELECT 1 FROM nodes n WHERE n.source_id = d.id
+    )
+    ORDER BY d.id
+    LIMIT %(limit)s
+"""
+
+
+def count_unprocessed_docs(limit=1000):
+    """Count docs that haven't been enriched yet (up to limit)"""
     conn = get_conn()
     cur = conn.cursor()
+    cur.execute(f"SELECT COUNT(*) FROM ({UNPROCESSED_DOCS_SQL}) pending",
+                {'max_chars': 0, 'limit': limit})
+    count = cur.fetchone()['count']
+    conn.close()
+    return count
 
-    # Get docs from source 2 (epstein_vol8) that don't have nodes yet
-    cur.execute("""
-        SELECT d.id, d.filename, c.full_text
-        FROM documents d
-        JOIN contents c ON d.id = c.doc_id
-        WHERE d.source_id = 2
-        AND d.id NOT IN (
-            SELECT DISTINCT source_id FROM nodes WHERE source_id IS NOT NULL
-        )
-        LIMIT %s
-    """, (limit,))
 
-    docs = cur.fetchall()
-    conn.close()
-    return docs
+def stream_unprocessed_docs(conn, limit=1000):
+    """Open a server-side cursor over docs that haven't been enriched yet
+
+    Only MAX_CHARS of each text is sent over, and rows are pulled with
+    fetchmany() as batches are needed rather than all up front.
+    """
+    cur = conn.cursor('vol8_stream')
+    cur.execute(UNPROCESSED_DOCS_SQL, {'max_chars': MAX_CHARS, 'limit': limit})
+    return cur
+
 
+_NORM_RE = re.compile(r'[^a-z0-9\s]')
 
+
+@lru_cache(maxsize=200_000)
 def normalize_name(s):
     """Normalize entity name"""
-    import re
-    return re.sub(r'[^a-z0-9\s]', '', s.lower()).strip()
+    return _NORM_RE.sub('', s.lower()).strip()
+
+
+_latencies = deque(maxlen=200)
+
+
+def haiku_timeout():
+    """Timeout for the next Haiku call, from recent successful latencies"""
+    if len(_latencies) < 10:
+        return TIMEOUT_DEFAULT
+    p90 = statistics.quantiles(_latencies, n=10)[-1]
+    return max(TIMEOUT_FLOOR, 1.5 * p90)
+
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def parse_json_object(text):
+    """Decode the first JSON object in text, ignoring prose around it
+
+    Unlike a regex for the braces, this copes with nested objects and
+    with trailing text that contains braces.
+    """
+    start = text.find('{')
+    while start != -1:
+        try:
+            obj, _ = _JSON_DECODER.raw_decode(text, start)
+            if isinstance(obj, dict):
+                return obj
+        except ValueError:
+            pass
+        start = text.find('{', start + 1)
+    return None
 
 
 async def call_haiku(client, docs_batch):
@@ -93,36 +160,45 @@ async def call_haiku(client, docs_batch):
 
     prompt = EXTRACTION_PROMPT.format(documents=doc_text)
 
-    try:
-        response = await client.post(
-            "https://api.anthropic.com/v1/messages",
-            headers={
-                "x-api-key": ANTHROPIC_API_KEY,
-                "anthropic-version": "2023-06-01",
-                "content-type": "application/json"
-            },
-            json={
-                "model": "claude-3-haiku-20240307",
-                "max_tokens": 2000,
-                "messages": [{"role": "user", "content": prompt}]
-            },
-            timeout=60.0
-        )
+    for attempt in range(MAX_RETRIES + 1):
+        timeout = haiku_timeout()
+        if attempt == MAX_RETRIES:
+            # Last try gets at least the old fixed timeout
+            timeout = max(timeout, TIMEOUT_DEFAULT)
+
+        start = time.monotonic()
+        try:
+            response = await client.post(
+                API_URL,
+                json={
+                    "model": "claude-3-haiku-20240307",
+                    "max_tokens": 2000,
+                    "messages": [{"role": "user", "content": prompt}]
+                },
+                timeout=httpx.Timeout(timeout, connect=5.0)
+            )
+        except httpx.TimeoutException:
+            print(f"Timeout after {timeout:.0f}s (attempt {attempt + 1}/{MAX_RETRIES + 1})")
+            continue
+        except Exception as e:
+            print(f"Error: {e}")
+            break
 
         if response.status_code == 200:
-            data = response.json()
-            content = data['content'][0]['text']
-
-            # Parse JSON from response
-            import re
-            match = re.search(r'\{[\s\S]*\}', content)
-            if match:
-                return json.loads(match.group()), [d['id'] for d in docs_batch]
+            _latencies.append(time.monotonic() - start)
+            try:
+                data = response.json()
+                content = data['content'][0]['text']
+
+                # Parse JSON from response
+                entities_data = parse_json_object(content)
+                if entities_data:
+                    return entities_data, [d['id'] for d in docs_batch]
+            except Exception as e:
+                print(f"Error: {e}")
         else:
             print(f"API error {response.status_code}: {response.text[:200]}")
-
-    except Exception as e:
-        print(f"Error: {e}")
+        break
 
     return None, [d['id'] for d in docs_batch]
 
@@ -132,10 +208,8 @@ def save_entities(entities_data, doc_ids):
     if not entities_data or 'entities' not in entities_data:
         return 0
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    added = 0
+    # Normalize and dedupe first, so the DB work is one lookup + one insert
+    wanted = {}
     for ent in entities_data['entities']:
         etype = ent.get('type', 'unknown')
         name = ent.get('name', '').strip()
@@ -147,75 +221,122 @@ def save_entities(entities_data, doc_ids):
         if not norm:
             continue
 
-        # Check if exists
-        cur.execute(
-            "SELECT id FROM nodes WHERE type=%s AND name_normalized=%s",
-            (etype, norm)
-        )
-        existing = cur.fetchone()
+        # Get first doc_id from this entity
+        edoc_ids = ent.get('doc_ids', doc_ids)
+        source_id = edoc_ids[0] if edoc_ids else doc_ids[0]
 
-        if not existing:
-            # Get first doc_id from this entity
-            edoc_ids = ent.get('doc_ids', doc_ids)
-            source_id = edoc_ids[0] if edoc_ids else doc_ids[0]
+        wanted.setdefault((etype, norm), (name, source_id))
 
-            cur.execute("""
-                INSERT INTO nodes (type, name, name_normalized, source_id, created_at, created_by)
-                VALUES (%s, %s, %s, %s, NOW(), 'enrich_vol8')
-                RETURNING id
-            """, (etype, name, norm, source_id))
-            added += 1
+    if not wanted:
+        return 0
 
-    conn.commit()
-    conn.close()
-    return added
+    conn = get_conn()
+    cur = conn.cursor()
 
+    # Check which already exist
+    existing = execute_values(cur, """
+        SELECT type, name_normalized FROM nodes
+        WHERE (type, name_normalized) IN (VALUES %s)
+    """, list(wanted), page_size=len(wanted), fetch=True)
+    existing = {(r['type'], r['name_normalized']) for r in existing}
+
+    new_rows = [
+        (etype, name, norm, source_id)
+        for (etype, norm), (name, source_id) in wanted.items()
+        if (etype, norm) not in existing
+    ]
+    if new_rows:
+        execute_values(cur, """
+            INSERT INTO nodes (type, name, name_normalized, source_id, created_at, created_by)
+            VALUES %s
+        """, new_rows, template="(%s, %s, %s, %s, NOW(), 'enrich_vol8')",
+            page_size=len(new_rows))
 
-async def process_batch(semaphore, client, batch, batch_num, total_batches):
-    """Process a single batch with semaphore for rate limiting"""
-    async with semaphore:
-        result, doc_ids = await call_haiku(client, batch)
+    conn.commit()
+    conn.close()
+    return len(new_rows)
 
-        if result:
-            added = save_entities(result, doc_ids)
-            print(f"[{batch_num}/{total_batches}] +{added} entities from {len(batch)} docs")
-            return added
-        else:
-            print(f"[{batch_num}/{total_batches}] Failed")
-            return 0
 
+async def warm_up(client, n):
+    """Open n keep-alive connections (TCP + TLS) before the first batch"""
+    async def ping():
+        try:
+            await client.head("https://api.anthropic.com/")
+        except httpx.HTTPError:
+            pass
 
-async def main(limit=10000, concurrency=CONCURRENCY):
-    """Main enrichment loop"""
+    await asyncio.gather(*[ping() for _ in range(n)])
 
-    print(f"Loading unprocessed docs (limit={limit})...")
-    docs = get_unprocessed_docs(limit)
 
-    if not docs:
-        print("No unprocessed documents found!")
-        return
+async def process_batch(client, batch, batch_num):
+    """Extract and save entities for a single batch"""
+    result, doc_ids = await call_haiku(client, batch)
 
-    print(f"Found {len(docs)} docs to process")
+    if result:
+        added = save_entities(result, doc_ids)
+        print(f"[{batch_num}] +{added} entities from {len(batch)} docs")
+        return added
+    else:
+        print(f"[{batch_num}] Failed")
+        return 0
 
-    # Create batches
-    batches = [docs[i:i+BATCH_SIZE] for i in range(0, len(docs), BATCH_SIZE)]
-    total_batches = len(batches)
 
-    print(f"Processing {total_batches} batches with concurrency={concurrency}")
+async def main(limit=10000, concurrency=CONCURRENCY):
+    """Main enrichment loop"""
 
-    semaphore = asyncio.Semaphore(concurrency)
-    total_added = 0
+    print(f"Streaming unprocessed docs (limit={limit}) with concurrency={concurrency}")
 
-    async with httpx.AsyncClient() as client:
-        tasks = [
-            process_batch(semaphore, client, batch, i+1, total_batches)
-            for i, batch in enumerate(batches)
-        ]
+    # Bounded hand-off: at most `concurrency` batches wait in memory
+    queue = asyncio.Queue(maxsize=concurrency)
+    total_batches = 0
 
-        results = await asyncio.gather(*tasks)
-        total_added = sum(r for r in results if r)
+    conn = get_conn()
+    try:
+        cur = stream_unprocessed_docs(conn, limit)
+
+        async def produce():
+            nonlocal total_batches
+            while True:
+                batch = cur.fetchmany(BATCH_SIZE)
+                if not batch:
+                    break
+                total_batches += 1
+                await queue.put((batch, total_batches))
+            for _ in range(concurrency):
+                await queue.put(None)
+
+        async def worker(client):
+            added = 0
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return added
+                added += await process_batch(client, *item)
+
+        # One client for the whole run, with a keep-alive connection per worker
+        limits = httpx.Limits(
+            max_connections=concurrency,
+            max_keepalive_connections=concurrency,
+            keepalive_expiry=300
+        )
+        async with httpx.AsyncClient(
+            headers=API_HEADERS,
+            limits=limits,
+            timeout=httpx.Timeout(TIMEOUT_DEFAULT, connect=5.0)
+        ) as client:
+            await warm_up(client, concurrency)
+            results = await asyncio.gather(
+                produce(), *[worker(client) for _ in range(concurrency)]
+            )
+    finally:
+        conn.close()
+
+    if not total_batches:
+        print("No unprocessed documents found!")
+        return
 
-    print(f"\nDone! Added {total_added} new entities")
+    total_added = sum(results[1:])
+    print(f"\nDone! Added {total_added} new entities from {total_batches} batches")
 
 
 if __name__ == "__main__":
@@ -227,7 +348,6 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     if args.dry_run:
-        docs = get_unprocessed_docs(args.limit)
-        print(f"Would process {len(docs)} documents")
+        print(f"Would process {count_unprocessed_docs(args.limit)} documents")
     else:
         asyncio.run(main(args.limit, args.concurrency))
@@ -8,16 +8,20 @@ Usage:
     python3 ingest.py --file path.txt    # Single file
 """
 
+import io
 import os
+import csv
 import sys
 import hashlib
 import json
 import re
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-import requests
+import httpx
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 
 # Add parent dir for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -25,6 +29,13 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 BASE_DIR = Path("/opt/rag")
 INBOX_DIR = BASE_DIR / "data/inbox"
 LLM_URL = "http://127.0.0.1:8001/v1/chat/completions"
+LLM_HEALTH_URL = "http://127.0.0.1:8001/health"
+LLM_CONCURRENCY = 1  # LLM calls in flight, unless the server reports its slots
+FILE_CHUNK = 16  # files processed concurrently in batch mode
+MAX_CHARS = 3000  # chars of each document sent to the LLM
+EXTRACTION_KIND = 'entities_ingest_v1'  # bump when the prompt changes
+
+_llm_slots = asyncio.Semaphore(LLM_CONCURRENCY)
 
 # Get DATABASE_URL from environment or .env file
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -46,65 +57,126 @@ def get_db_conn():
 
 
 def file_hash(path):
-    """Calculate SHA256 hash of file"""
-    h = hashlib.sha256()
-    with open(path, 'rb') as f:
-        for chunk in iter(lambda: f.read(8192), b''):
-            h.update(chunk)
-    return h.hexdigest()
+    """Calculate SHA256 hash of file, streamed in C (Python 3.11+)"""
+    with open(path, 'rb', buffering=0) as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+# Content markers for detect_type, matched case-insensitively in one pass.
+# The lookahead lets overlapping markers each be seen.
+_TYPE_MARKERS_RE = re.compile(
+    r'(?=(?:(?P<sender>from:)|(?P<subject>subject:)|(?P<deposition>deposition)'
+    r'|(?P<q>q\.)|(?P<a>a\.)|(?P<transcript>transcript)|(?P<court>court|plaintiff)))',
+    re.IGNORECASE
+)
+TYPE_SCAN_CHARS = 16384  # doc-type signals live in the header
 
 
 def detect_type(content):
     """Detect document type from content"""
-    c = content.lower()
-    if 'from:' in c and 'subject:' in c:
+    found = {m.lastgroup for m in _TYPE_MARKERS_RE.finditer(content, 0, TYPE_SCAN_CHARS)}
+
+    if 'sender' in found and 'subject' in found:
         return 'email'
-    if 'deposition' in c or ('q.' in c and 'a.' in c):
+    if 'deposition' in found or ('q' in found and 'a' in found):
         return 'deposition'
-    if 'transcript' in c:
+    if 'transcript' in found:
         return 'transcript'
-    if 'court' in c or 'plaintiff' in c:
+    if 'court' in found:
         return 'court_filing'
     return 'misc'
 
 
-def call_llm(prompt):
+_JSON_DECODER = json.JSONDecoder()
+
+
+def parse_json_object(text):
+    """Decode the first JSON object in text, ignoring prose around it
+
+    Unlike a regex for the braces, this copes with nested objects and
+    with trailing text that contains braces.
+    """
+    start = text.find('{')
+    while start != -1:
+        try:
+            obj, _ = _JSON_DECODER.raw_decode(text, start)
+            if isinstance(obj, dict):
+                return obj
+        except ValueError:
+            pass
+        start = text.find('{', start + 1)
+    return None
+
+
+async def size_llm_slots(client):
+    """Match LLM concurrency to the slots the server reports in /health
+
+    Going past the server's capacity only queues requests inside it and
+    pushes them toward the timeout.
+    """
+    global _llm_slots
+    try:
+        slots = (await client.get(LLM_HEALTH_URL, timeout=5)).json().get('slots')
+    except Exception:
+        slots = None
+    slots = slots or LLM_CONCURRENCY
+    _llm_slots = asyncio.Semaphore(slots)
+    return slots
+
+
+async def call_llm(client, prompt):
     """Call local Phi-3 for entity extraction"""
     try:
-        r = requests.post(LLM_URL, json={
-            "model": "phi-3",
-            "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": 1500,
-            "temperature": 0.1
-        }, timeout=60)
-        if r.ok:
+        async with _llm_slots:
+            r = await client.post(LLM_URL, json={
+                "model": "phi-3",
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": 1500,
+                "temperature": 0.1,
+                # Let the server constrain decoding to valid JSON
+                "response_format": {"type": "json_object"}
+            }, timeout=60)
+        if r.is_success:
             return r.json()['choices'][0]['message']['content']
     except Exception as e:
         print(f"LLM error: {e}")
     return None
 
 
-def extract_entities(content):
-    """Extract entities using Phi-3"""
+async def extract_entities(cur, client, content):
+    """Extract entities using Phi-3, reusing earlier results for identical text"""
+    text = content[:MAX_CHARS]
+    ihash = hashlib.sha256(text.encode()).hexdigest()
+
+    cur.execute(
+        "SELECT result FROM llm_extractions WHERE input_hash=%s AND kind=%s",
+        (ihash, EXTRACTION_KIND)
+    )
+    cached = cur.fetchone()
+    if cached:
+        return cached['result']
+
     prompt = f"""Extract entities from this document. Return ONLY valid JSON.
 
 Document:
-{content[:3000]}
+{text}
 
 Return format:
 {{"persons": ["name1", "name2"], "organizations": ["org1"], "locations": ["loc1"], "emails": ["email@example.com"], "dates": ["2019-07-06"]}}
 
 JSON:"""
 
-    result = call_llm(prompt)
-    if result:
-        try:
-            match = re.search(r'\{[^{}]+\}', result, re.DOTALL)
-            if match:
-                return json.loads(match.group())
-        except:
-            pass
-    return {}
+    result = await call_llm(client, prompt)
+    entities = parse_json_object(result) if result else None
+    entities = entities or {}
+
+    if entities:
+        cur.execute("""
+            INSERT INTO llm_extractions (input_hash, kind, result)
+            VALUES (%s, %s, %s)
+            ON CONFLICT DO NOTHING
+        """, (ihash, EXTRACTION_KIND, json.dumps(entities)))
+    return entities
 
 
 def normalize(s):
@@ -112,73 +184,157 @@ def normalize(s):
     return re.sub(r'[^a-z0-9\s]', '', s.lower()).strip()
 
 
-def ingest_file(cur, filepath, source_id):
-    """Ingest single file into database"""
-
+def store_entities(cur, entities, doc_id):
+    """Create nodes for extracted entities that don't exist yet, return count added"""
+    # Dedupe in memory, then one lookup + one insert
+    wanted = {}
+    for etype, items in entities.items():
+        node_type = etype.rstrip('s')  # persons -> person
+        if node_type == 'date':
+            node_type = 'event'
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            if not isinstance(item, str) or len(item) < 2:
+                continue
+            norm = normalize(item)
+            if not norm:
+                continue
+            wanted.setdefault((node_type, norm), item)
+
+    if not wanted:
+        return 0
+
+    # nodes has no unique (type, name_normalized) constraint to upsert against
+    existing = execute_values(cur, """
+        SELECT type, name_normalized FROM nodes
+        WHERE (type, name_normalized) IN (VALUES %s)
+    """, list(wanted), page_size=len(wanted), fetch=True)
+    existing = {(r['type'], r['name_normalized']) for r in existing}
+
+    rows = [
+        (node_type, item, norm, doc_id)
+        for (node_type, norm), item in wanted.items()
+        if (node_type, norm) not in existing
+    ]
+    if rows:
+        execute_values(cur, """
+            INSERT INTO nodes (type, name, name_normalized, source_id, created_at, created_by)
+            VALUES %s
+        """, rows, template="(%s, %s, %s, %s, NOW(), 'ingest')", page_size=len(rows))
+    return len(rows)
+
+
+def hash_files(files):
+    """Hash many files in parallel (hashlib releases the GIL)"""
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+        return list(ex.map(file_hash, files))
+
+
+def read_file(filepath, fhash=None):
+    """Read a file's text and hash; hash is None if it's too short to ingest"""
     with open(filepath, 'r', errors='ignore') as f:
         content = f.read()
 
     if len(content.strip()) < 50:
-        return None, "too_short"
+        return content, None
 
-    fhash = file_hash(filepath)
+    return content, fhash or file_hash(filepath)
 
-    # Check if exists
+
+def is_duplicate(cur, fhash):
+    """Check if a document with this hash exists"""
     cur.execute("SELECT 1 FROM documents WHERE file_hash=%s", (fhash,))
-    if cur.fetchone():
+    return cur.fetchone() is not None
+
+
+async def prepare_file(cur, client, filepath, fhash=None):
+    """Read, classify and extract entities for a file, without writing it
+
+    Returns (doc, None), or (None, reason) if the file is skipped. Pass
+    fhash when the caller has already hashed the file and checked it
+    against existing documents.
+
+    File reading/hashing runs in a thread and the LLM call is awaited
+    here, so the writes in write_documents never straddle an await and
+    files can share one cursor.
+    """
+    checked = fhash is not None
+    content, fhash = await asyncio.to_thread(read_file, filepath, fhash)
+
+    if fhash is None:
+        return None, "too_short"
+
+    if not checked and is_duplicate(cur, fhash):
         return None, "duplicate"
 
     doc_type = detect_type(content)
+    entities = await extract_entities(cur, client, content)
 
-    # Insert document
-    cur.execute("""
-        INSERT INTO documents (source_id, filename, filepath, file_hash, doc_type, char_count, status, date_added)
-        VALUES (%s, %s, %s, %s, %s, %s, 'indexed', NOW())
-        RETURNING id
-    """, (source_id, os.path.basename(filepath), str(filepath), fhash, doc_type, len(content)))
-    doc_id = cur.fetchone()['id']
-
-    # Insert content
-    cur.execute("""
-        INSERT INTO contents (doc_id, full_text, created_at)
-        VALUES (%s, %s, NOW())
-        ON CONFLICT (doc_id) DO UPDATE SET full_text = EXCLUDED.full_text
-    """, (doc_id, content))
-
-    # Extract and store entities
-    entities = extract_entities(content)
-    entities_added = 0
+    return {
+        "filepath": str(filepath),
+        "file_hash": fhash,
+        "content": content,
+        "doc_type": doc_type,
+        "entities": entities,
+    }, None
 
-    for etype, items in entities.items():
-        node_type = etype.rstrip('s')  # persons -> person
-        if node_type == 'date':
-            node_type = 'event'
-        for item in items:
-            if not item or len(item) < 2:
-                continue
-            norm = normalize(item)
-            if not norm:
-                continue
 
-            # Get or create node
-            cur.execute(
-                "SELECT id FROM nodes WHERE type=%s AND name_normalized=%s",
-                (node_type, norm)
-            )
-            existing = cur.fetchone()
+def write_documents(cur, docs, source_id):
+    """Insert prepared documents, their contents and entities
 
-            if existing:
-                node_id = existing['id']
-            else:
-                cur.execute("""
-                    INSERT INTO nodes (type, name, name_normalized, source_id, created_at, created_by)
-                    VALUES (%s, %s, %s, %s, NOW(), 'ingest')
-                    RETURNING id
-                """, (node_type, item, norm, doc_id))
-                node_id = cur.fetchone()['id']
-                entities_added += 1
+    Returns {file_hash: (doc_id, details)} for the documents inserted;
+    ones whose hash already exists are left out.
+    """
+    if not docs:
+        return {}
+
+    inserted = execute_values(cur, """
+        INSERT INTO documents (source_id, filename, filepath, file_hash, doc_type, char_count, status, date_added)
+        VALUES %s
+        ON CONFLICT (file_hash) DO NOTHING
+        RETURNING id, file_hash
+    """, [
+        (source_id, os.path.basename(d['filepath']), d['filepath'], d['file_hash'],
+         d['doc_type'], len(d['content']))
+        for d in docs
+    ], template="(%s, %s, %s, %s, %s, %s, 'indexed', NOW())",
+        page_size=len(docs), fetch=True)
+    doc_ids = {r['file_hash']: r['id'] for r in inserted}
+
+    if not doc_ids:
+        return {}
+
+    # Stream contents for the new documents through COPY; the ids are
+    # freshly assigned, so there is nothing for ON CONFLICT to update
+    buf = io.StringIO()
+    csv.writer(buf).writerows(
+        (doc_ids[d['file_hash']], d['content'])
+        for d in docs if d['file_hash'] in doc_ids
+    )
+    buf.seek(0)
+    cur.copy_expert("COPY contents (doc_id, full_text) FROM STDIN WITH (FORMAT csv)", buf)
+
+    written = {}
+    for d in docs:
+        doc_id = doc_ids.get(d['file_hash'])
+        if doc_id is None:
+            continue
+        entities_added = store_entities(cur, d['entities'], doc_id)
+        written[d['file_hash']] = (
+            doc_id, {"type": d['doc_type'], "entities": entities_added, "chars": len(d['content'])}
+        )
+    return written
+
+
+async def ingest_file(cur, client, filepath, source_id):
+    """Ingest single file into database"""
+    doc, reason = await prepare_file(cur, client, filepath)
+    if doc is None:
+        return None, reason
 
-    return doc_id, {"type": doc_type, "entities": entities_added, "chars": len(content)}
+    written = write_documents(cur, [doc], source_id)
+    return written.get(doc['file_hash'], (None, "duplicate"))
 
 
 async def ingest_with_progress(source_name="inbox_upload"):
@@ -200,7 +356,6 @@ async def ingest_with_progress(source_name="inbox_upload"):
                 RETURNING id
             """, (source_name, datetime.now().strftime('%Y-%m-%d')))
             source_id = cur.fetchone()['id']
-            conn.commit()
 
         # Get files
         INBOX_DIR.mkdir(parents=True, exist_ok=True)
@@ -216,50 +371,103 @@ async def ingest_with_progress(source_name="inbox_upload"):
         processed = 0
         skipped = 0
         errors = 0
-
-        for i, f in enumerate(files):
-            try:
-                doc_id, result = ingest_file(cur, str(f), source_id)
-
-                if doc_id:
-                    processed += 1
-                    yield {
-                        "type": "progress",
-                        "current": i + 1,
-                        "total": total,
-                        "file": f.name,
-                        "status": "ingested",
-                        "details": result
-                    }
-                    # Move to processed folder
-                    processed_dir = INBOX_DIR / "processed"
-                    processed_dir.mkdir(exist_ok=True)
-                    f.rename(processed_dir / f.name)
-                else:
-                    skipped += 1
-                    yield {
-                        "type": "progress",
-                        "current": i + 1,
-                        "total": total,
-                        "file": f.name,
-                        "status": "skipped",
-                        "reason": result
-                    }
-
-                # Commit every 10 files
-                if (i + 1) % 10 == 0:
-                    conn.commit()
-
-            except Exception as e:
-                errors += 1
+        current = 0
+
+        # Hash everything up front and drop duplicates (of existing documents
+        # or of each other) with one query, before any LLM work
+        hashes = await asyncio.to_thread(hash_files, files)
+        cur.execute("SELECT file_hash FROM documents WHERE file_hash = ANY(%s)", (list(set(hashes)),))
+        seen = {r['file_hash'] for r in cur.fetchall()}
+
+        fresh = []
+        for f, fhash in zip(files, hashes):
+            if fhash in seen:
+                skipped += 1
+                current += 1
                 yield {
                     "type": "progress",
-                    "current": i + 1,
+                    "current": current,
                     "total": total,
                     "file": f.name,
-                    "status": "error",
-                    "error": str(e)
+                    "status": "skipped",
+                    "reason": "duplicate"
                 }
+            else:
+                seen.add(fhash)
+                fresh.append((f, fhash))
+
+        async with httpx.AsyncClient() as client:
+            slots = await size_llm_slots(client)
+            print(f"LLM concurrency: {slots}")
+
+            for start in range(0, len(fresh), FILE_CHUNK):
+                chunk = fresh[start:start + FILE_CHUNK]
+                prepared = await asyncio.gather(
+                    *[prepare_file(cur, client, str(f), fhash) for f, fhash in chunk],
+                    return_exceptions=True
+                )
+
+                # One multi-row insert + COPY for the whole chunk
+                docs = [p[0] for p in prepared if not isinstance(p, Exception) and p[0]]
+                try:
+                    written = write_documents(cur, docs, source_id)
+                    write_error = None
+                except Exception as e:
+                    conn.rollback()
+                    written = {}
+                    write_error = e
+
+                for (f, fhash), outcome in zip(chunk, prepared):
+                    current += 1
+                    try:
+                        if isinstance(outcome, Exception):
+                            raise outcome
+                        doc, reason = outcome
+                        if doc is not None:
+                            if write_error:
+                                raise write_error
+                            doc_id, result = written.get(fhash, (None, "duplicate"))
+                        else:
+                            doc_id, result = None, reason
+
+                        if doc_id:
+                            processed += 1
+                            yield {
+                                "type": "progress",
+                                "current": current,
+                                "total": total,
+                                "file": f.name,
+                                "status": "ingested",
+                                "details": result
+                            }
+                            # Move to processed folder
+                            processed_dir = INBOX_DIR / "processed"
+                            processed_dir.mkdir(exist_ok=True)
+                            f.rename(processed_dir / f.name)
+                        else:
+                            skipped += 1
+                            yield {
+                                "type": "progress",
+                                "current": current,
+                                "total": total,
+                                "file": f.name,
+                                "status": "skipped",
+                                "reason": result
+                            }
+
+                    except Exception as e:
+                        errors += 1
+                        yield {
+                            "type": "progress",
+                            "current": current,
+                            "total": total,
+                            "file": f.name,
+                            "status": "error",
+                            "error": str(e)
+                        }
+
+                # Commit once per chunk
+                conn.commit()
 
         conn.commit()
 
@@ -278,7 +486,6 @@ async def ingest_with_progress(source_name="inbox_upload"):
 
 def main():
     import argparse
-    import asyncio
 
     parser = argparse.ArgumentParser()
     parser.add_argument('--file', help='Single file to ingest')
@@ -302,7 +509,11 @@ def main():
             """, (args.source, datetime.now().strftime('%Y-%m-%d')))
             source_id = cur.fetchone()['id']
 
-        doc_id, result = ingest_file(cur, args.file, source_id)
+        async def ingest_one():
+            async with httpx.AsyncClient() as client:
+                return await ingest_file(cur, client, args.file, source_id)
+
+        doc_id, result = asyncio.run(ingest_one())
         conn.commit()
 
         if doc_id:
@@ -30,6 +30,8 @@ import json
 import re
 import time
 import csv
+import itertools
+from contextlib import contextmanager
 from pathlib import Path
 
 # Increase CSV field size limit for large text fields
@@ -38,6 +40,7 @@ from datetime import datetime
 from typing import List, Dict, Any, Tuple, Optional, AsyncGenerator
 
 import httpx
+import orjson
 
 # =============================================================================
 # CONFIGURATION
@@ -45,6 +48,7 @@ import httpx
 
 BATCH_SIZE = 3  # documents per Haiku call (smaller for richer context)
 DEFAULT_CONCURRENCY = 10
+CORPUS_CACHE_MAX = 8192  # (term, limit) -> corpus hits kept across documents
 MAX_RETRIES = 3
 HAIKU_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
 
@@ -58,7 +62,7 @@ DB_SOURCES = Path("/opt/rag/db/sources.db")
 # STOP WORDS (from pipeline.py)
 # =============================================================================
 
-STOP_WORDS = {
+STOP_WORDS = frozenset({
     'the', 'a', 'an', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
     'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
     'should', 'may', 'might', 'must', 'shall', 'can', 'need', 'dare',
@@ -72,7 +76,7 @@ STOP_WORDS = {
     'what', 'which', 'who', 'whom', 'this', 'that', 'these', 'those',
     'tell', 'show', 'find', 'give', 'know', 'about', 'look', 'want',
     'search', 'explain', 'describe', 'list', 'help', 'please',
-}
+})
 
 # =============================================================================
 # EXTRACTION PROMPT (enriched version with cross-reference context)
@@ -177,88 +181,189 @@ def get_sqlite_connection(db_path):
     return conn
 
 
+_pg_pool = None
+
+
 def get_pg_connection():
-    """Get PostgreSQL connection for graph/scores/audit"""
-    import psycopg2
-    import psycopg2.extras
-    return psycopg2.connect(DATABASE_URL)
+    """Borrow a pooled PostgreSQL connection for graph/scores/audit"""
+    global _pg_pool
+    if _pg_pool is None:
+        import psycopg2.pool
+        _pg_pool = psycopg2.pool.ThreadedConnectionPool(minconn=1, maxconn=8, dsn=DATABASE_URL)
+    return _pg_pool.getconn()
 
 
-def search_corpus_simple(term: str, limit: int = 10) -> List[Dict]:
-    """Simple corpus search for cross-referencing"""
-    conn = get_sqlite_connection(DB_SOURCES)
-    cursor = conn.cursor()
+def release_pg_connection(conn):
+    """Return a connection to the pool (uncommitted work is rolled back)"""
+    _pg_pool.putconn(conn)
+
 
-    # Use FTS if available, fall back to LIKE
+@contextmanager
+def pg_transaction(conn=None):
+    """
+    Yield a connection for a unit of work.
+
+    With conn given, the caller owns the transaction and nothing is
+    committed here. Otherwise a pooled connection is borrowed, committed
+    on success and released.
+    """
+    if conn is not None:
+        yield conn
+        return
+    conn = get_pg_connection()
     try:
-        cursor.execute("""
-            SELECT doc_id, subject, sender_email, date_sent,
-                   snippet(emails_fts, 0, '', '', '...', 30) as snippet
-            FROM emails_fts
-            WHERE emails_fts MATCH ?
-            LIMIT ?
-        """, (term, limit))
-        results = [dict(r) for r in cursor.fetchall()]
+        yield conn
+        conn.commit()
+    finally:
+        release_pg_connection(conn)
+
+
+# One ranked FTS subquery per term; search_corpus_multi UNION ALLs them so
+# every term keeps its own ranking and LIMIT in a single statement
+_FTS_TERM_SQL = """
+    SELECT * FROM (
+        SELECT ? AS term, doc_id, subject, sender_email, date_sent,
+               snippet(emails_fts, 0, '', '', '...', 30) as snippet
+        FROM emails_fts
+        WHERE emails_fts MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    )
+"""
+
+
+def _like_search(cursor, term: str, limit: int) -> List[Dict]:
+    """LIKE search for corpora without the FTS table"""
+    search_pattern = f"%{term}%"
+    cursor.execute("""
+        SELECT doc_id, subject, sender_email, date_sent,
+               substr(body_text, 1, 200) as snippet
+        FROM emails
+        WHERE subject LIKE ? OR body_text LIKE ?
+        LIMIT ?
+    """, (search_pattern, search_pattern, limit))
+    return [dict(r) for r in cursor.fetchall()]
+
+
+def _fts_phrase(term: str) -> str:
+    """Quote a term as an FTS5 phrase"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+# (term, per_term_limit) -> rows from earlier searches. The corpus is read-only
+# for the life of a run, and common names and domains recur across documents.
+_CORPUS_HITS_CACHE: Dict[Tuple[str, int], List[Dict]] = {}
+
+
+def _cache_corpus_hits(term_hits: Dict[Tuple[str, int], List[Dict]]):
+    """Remember search results, dropping the oldest 10% when full"""
+    _CORPUS_HITS_CACHE.update(term_hits)
+    if len(_CORPUS_HITS_CACHE) > CORPUS_CACHE_MAX:
+        for key in list(itertools.islice(_CORPUS_HITS_CACHE, CORPUS_CACHE_MAX // 10)):
+            del _CORPUS_HITS_CACHE[key]
+
+
+def search_corpus_multi(cursor, terms: List[Tuple[str, int]]) -> Dict[str, List[Dict]]:
+    """
+    Search the corpus for several terms in one statement.
+
+    terms is a list of (term, per_term_limit). Terms searched earlier in the
+    run are answered from cache; the rest each get a ranked phrase subquery
+    with their own limit, UNION ALL-ed into one query, so results match
+    searching each term separately. Returns {term: [rows]}.
+    """
+    hits = {}
+    wanted = {}
+    for term, term_limit in terms:
+        if not term or term in hits or term in wanted:
+            continue
+        cached = _CORPUS_HITS_CACHE.get((term, term_limit))
+        if cached is not None:
+            hits[term] = cached
+        else:
+            wanted[term] = term_limit
+    if not wanted:
+        return hits
+    hits.update((term, []) for term in wanted)
+
+    params = []
+    for term, term_limit in wanted.items():
+        params.extend((term, _fts_phrase(term), term_limit))
+    try:
+        cursor.execute(' UNION ALL '.join([_FTS_TERM_SQL] * len(wanted)), params)
+        for row in cursor.fetchall():
+            row = dict(row)
+            hits[row.pop('term')].append(row)
     except:
-        # Fallback to LIKE
-        search_pattern = f"%{term}%"
-        cursor.execute("""
-            SELECT doc_id, subject, sender_email, date_sent,
-                   substr(body_text, 1, 200) as snippet
-            FROM emails
-            WHERE subject LIKE ? OR body_text LIKE ?
-            LIMIT ?
-        """, (search_pattern, search_pattern, limit))
-        results = [dict(r) for r in cursor.fetchall()]
+        # Fallback to LIKE, one query per term on the same connection
+        for term, term_limit in wanted.items():
+            hits[term] = _like_search(cursor, term, term_limit)
 
-    conn.close()
-    return results
+    _cache_corpus_hits({(term, term_limit): hits[term] for term, term_limit in wanted.items()})
+    return hits
 
 
 def get_processed_documents(dataset_name: str) -> set:
     """Get document IDs already processed for this dataset"""
-    conn = get_pg_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT DISTINCT target_id
-        FROM evidence_chain
-        WHERE target_type = 'document'
-        AND reason LIKE %s
-        AND action = 'dataset_extracted'
-    """, (f'%{dataset_name}%',))
-
-    processed = {str(row[0]) for row in cursor.fetchall()}
-    conn.close()
-    return processed
+    with pg_transaction() as conn:
+        cursor = conn.cursor()
+        # log_extraction writes reason as exactly 'Dataset ingestion: <name>',
+        # so match it exactly (served by idx_evidence_chain_dataset from
+        # db/migrate_to_age.py)
+        cursor.execute("""
+            SELECT DISTINCT target_id
+            FROM evidence_chain
+            WHERE target_type = 'document'
+            AND reason = %s
+            AND action = 'dataset_extracted'
+        """, (f'Dataset ingestion: {dataset_name}',))
+        return {str(row[0]) for row in cursor.fetchall()}
 
 
 # =============================================================================
 # PIPELINE-STYLE ENTITY DISCOVERY
 # =============================================================================
 
+_QUOTED_RE = re.compile(r'"([^"]+)"')
+_CAPS_RE = re.compile(r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)\b')
+_WORD4_RE = re.compile(r'\b([a-zA-Z]{4,})\b')
+
+# Every local entity pattern in one alternation, so extract_entities_local
+# walks the text once. Group names are the entities keys.
+_ENTITY_RE = re.compile(
+    r'(?P<emails>\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b)'
+    r'|(?P<names>\b[A-Z][a-z]{2,15} [A-Z][a-z]{2,15}\b)'
+    r'|(?P<amounts>\$[\d,]+(?:\.\d{2})?|\€[\d,]+(?:\.\d{2})?)'
+    r'|(?P<dates>\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}/\d{2,4}\b)'
+    r'|(?P<phones>\b\d{3}[-.]?\d{3}[-.]?\d{4}\b)'
+)
+
+_SKIP_NAMES = frozenset({'new york', 'los angeles', 'united states', 'virgin islands', 'prime minister'})
+_FREEMAIL_DOMAINS = frozenset({'gmail.com', 'yahoo.com', 'hotmail.com', 'outlook.com'})
+
+
 def extract_search_terms(text: str) -> List[str]:
     """Extract meaningful search terms (like pipeline.py)"""
     # Find quoted phrases
-    quoted = re.findall(r'"([^"]+)"', text)
+    quoted = _QUOTED_RE.findall(text)
 
     # Find capitalized words (names)
-    caps = re.findall(r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)\b', text)
+    caps = _CAPS_RE.findall(text)
 
     # Get remaining words
-    words = [w.lower() for w in re.findall(r'\b([a-zA-Z]{4,})\b', text.lower())
-             if w.lower() not in STOP_WORDS]
+    words = [w for w in map(str.lower, _WORD4_RE.findall(text)) if w not in STOP_WORDS]
 
-    terms = quoted + caps + words
     seen = set()
     result = []
-    for t in terms:
+    for t in itertools.chain(quoted, caps, words):
         tl = t.lower()
         if tl not in seen:
             seen.add(tl)
             result.append(t)
+            if len(result) == 8:
+                break
 
-    return result[:8]
+    return result
 
 
 def extract_entities_local(text: str) -> Dict[str, List[str]]:
@@ -272,28 +377,20 @@ def extract_entities_local(text: str) -> Dict[str, List[str]]:
         'phones': []
     }
 
-    # Email addresses
-    entities['emails'] = re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)
-
-    # Names (two capitalized words)
-    names = re.findall(r'\b([A-Z][a-z]{2,15} [A-Z][a-z]{2,15})\b', text)
-    skip_names = {'new york', 'los angeles', 'united states', 'virgin islands', 'prime minister'}
-    entities['names'] = [n for n in names if n.lower() not in skip_names]
-
-    # Money amounts
-    entities['amounts'] = re.findall(r'\$[\d,]+(?:\.\d{2})?|\€[\d,]+(?:\.\d{2})?', text)
+    for match in _ENTITY_RE.finditer(text):
+        kind = match.lastgroup
+        value = match.group()
 
-    # Dates
-    entities['dates'] = re.findall(r'\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}/\d{2,4}\b', text)
-
-    # Domains from emails
-    for email in entities['emails']:
-        domain = email.split('@')[1] if '@' in email else ''
-        if domain and domain not in ['gmail.com', 'yahoo.com', 'hotmail.com', 'outlook.com']:
-            entities['domains'].append(domain)
+        # Names (two capitalized words)
+        if kind == 'names' and value.lower() in _SKIP_NAMES:
+            continue
+        entities[kind].append(value)
 
-    # Phone numbers
-    entities['phones'] = re.findall(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b', text)
+        # Domains from emails
+        if kind == 'emails':
+            domain = value.split('@')[1]
+            if domain and domain not in _FREEMAIL_DOMAINS:
+                entities['domains'].append(domain)
 
     return entities
 
@@ -314,13 +411,27 @@ def discover_connections(document: Dict[str, Any]) -> Dict[str, Any]:
     if not content:
         return connections
 
-    # Step 1: Extract search terms
-    terms = extract_search_terms(content)
+    # Step 1: Extract search terms and local entities
+    terms = extract_search_terms(content)[:5]
+    entities = extract_entities_local(content)
+    names = entities['names'][:3]
+    domains = [(d, d.split('.')[0]) for d in entities['domains'][:2]]
+    domains = [(d, stem) for d, stem in domains if len(stem) > 3]
 
-    # Step 2: Search corpus for each term
+    # Step 2: One corpus query for every term, name and domain
+    conn = get_sqlite_connection(DB_SOURCES)
+    try:
+        hits = search_corpus_multi(
+            conn.cursor(),
+            [(t, 5) for t in terms] + [(n, 3) for n in names] + [(stem, 3) for _, stem in domains]
+        )
+    finally:
+        conn.close()
+
+    # Step 3: Search trail for the extracted terms
     all_related = []
-    for term in terms[:5]:
-        results = search_corpus_simple(term, limit=5)
+    for term in terms:
+        results = hits.get(term)
         if results:
             connections['search_trail'].append({
                 'term': term,
@@ -329,12 +440,9 @@ def discover_connections(document: Dict[str, Any]) -> Dict[str, Any]:
             })
             all_related.extend(results)
 
-    # Step 3: Extract local entities
-    entities = extract_entities_local(content)
-
-    # Step 4: Search for people mentioned
-    for name in entities['names'][:3]:
-        results = search_corpus_simple(name, limit=3)
+    # Step 4: People mentioned
+    for name in names:
+        results = hits.get(name)
         if results:
             connections['known_entities'].append({
                 'entity': name,
@@ -343,18 +451,16 @@ def discover_connections(document: Dict[str, Any]) -> Dict[str, Any]:
                 'email_ids': [r['doc_id'] for r in results]
             })
 
-    # Step 5: Search for email domains
-    for domain in entities['domains'][:2]:
-        domain_term = domain.split('.')[0]
-        if len(domain_term) > 3:
-            results = search_corpus_simple(domain_term, limit=3)
-            if results:
-                connections['known_entities'].append({
-                    'entity': domain,
-                    'type': 'domain',
-                    'in_corpus': True,
-                    'email_ids': [r['doc_id'] for r in results]
-                })
+    # Step 5: Email domains
+    for domain, domain_term in domains:
+        results = hits.get(domain_term)
+        if results:
+            connections['known_entities'].append({
+                'entity': domain,
+                'type': 'domain',
+                'in_corpus': True,
+                'email_ids': [r['doc_id'] for r in results]
+            })
 
     # Dedupe related emails
     seen_ids = set()
@@ -377,8 +483,12 @@ def discover_connections(document: Dict[str, Any]) -> Dict[str, Any]:
 
 def parse_json_input(filepath: Path) -> List[Dict[str, Any]]:
     """Parse JSON file (array of documents or single object)"""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    raw = filepath.read_bytes()
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        # orjson rejects NaN/Infinity and >64-bit ints that json accepts
+        data = json.loads(raw)
 
     if isinstance(data, list):
         return data
@@ -632,114 +742,132 @@ def safe_db_value(value: Any) -> str:
     return str(value)
 
 
-def insert_nodes(nodes: List[Dict], source_id: str, source_type: str = 'document', dry_run: bool = False) -> Dict[str, int]:
+def insert_nodes(nodes: List[Dict], source_id: str, source_type: str = 'document', dry_run: bool = False, conn=None) -> Dict[str, int]:
     """Insert nodes into PostgreSQL graph database"""
     if dry_run:
         return {safe_db_value(n.get('name', '')): i for i, n in enumerate(nodes, 1)}
 
-    conn = get_pg_connection()
-    cursor = conn.cursor()
-    node_id_map = {}
+    from psycopg2.extras import execute_values
 
+    rows = []
     for node in nodes:
         name = safe_db_value(node.get('name'))
-        node_type = safe_db_value(node.get('type', 'unknown'))
-        context = safe_db_value(node.get('context', ''))
+        if name:
+            rows.append((name, safe_db_value(node.get('type', 'unknown')), safe_db_value(node.get('context', ''))))
+    if not rows:
+        return {}
 
-        if not name:
-            continue
+    node_id_map = {}
 
-        name_normalized = name.lower().strip()
+    with pg_transaction(conn) as conn:
+        cursor = conn.cursor()
 
-        # Check exists
-        cursor.execute("SELECT id FROM nodes WHERE name = %s AND type = %s", (name, node_type))
-        existing = cursor.fetchone()
+        keys = list(dict.fromkeys((name, node_type) for name, node_type, _ in rows))
 
-        if existing:
-            node_id = existing[0]
-        else:
-            cursor.execute("""
+        # nodes has no unique (name, type) constraint to upsert against, so
+        # serialize concurrent ingesters on these keys until commit. Locks are
+        # taken in hash order so two writers can't deadlock.
+        cursor.execute("""
+            SELECT pg_advisory_xact_lock(h)
+            FROM (SELECT DISTINCT hashtext(k) AS h FROM unnest(%s::text[]) AS k ORDER BY h) AS locks
+        """, ([f"{node_type}\x1f{name}" for name, node_type in keys],))
+
+        # Resolve every existing (name, type) in one query
+        found = execute_values(cursor, """
+            SELECT n.name, n.type, MIN(n.id)
+            FROM (VALUES %s) AS wanted(name, type)
+            JOIN nodes n ON n.name = wanted.name AND n.type = wanted.type
+            GROUP BY n.name, n.type
+        """, keys, page_size=len(keys), fetch=True)
+        node_ids = {(name, node_type): node_id for name, node_type, node_id in found}
+
+        # Insert the rest in one statement
+        missing = [key for key in keys if key not in node_ids]
+        if missing:
+            created = execute_values(cursor, """
                 INSERT INTO nodes (type, name, name_normalized, source_db, created_by)
-                VALUES (%s, %s, %s, %s, 'dataset_ingest')
-                RETURNING id
-            """, (node_type, name, name_normalized, source_type))
-            node_id = cursor.fetchone()[0]
-
-        node_id_map[name] = node_id
-
-        if context:
-            cursor.execute("""
+                VALUES %s
+                RETURNING name, type, id
+            """, [(node_type, name, name.lower().strip(), source_type) for name, node_type in missing],
+                template="(%s, %s, %s, %s, 'dataset_ingest')", page_size=len(missing), fetch=True)
+            node_ids.update(((name, node_type), node_id) for name, node_type, node_id in created)
+
+        prop_rows = []
+        for name, node_type, context in rows:
+            node_id = node_id_map[name] = node_ids[(name, node_type)]
+            if context:
+                prop_rows.append((node_id, context))
+
+        if prop_rows:
+            execute_values(cursor, """
                 INSERT INTO properties (node_id, key, value, created_by)
-                VALUES (%s, 'context', %s, 'dataset_ingest')
-            """, (node_id, context))
+                VALUES %s
+            """, prop_rows, template="(%s, 'context', %s, 'dataset_ingest')", page_size=len(prop_rows))
 
-    conn.commit()
-    conn.close()
     return node_id_map
 
 
-def insert_edges(edges: List[Dict], node_id_map: Dict[str, int], source_id: str, dry_run: bool = False) -> int:
+def insert_edges(edges: List[Dict], node_id_map: Dict[str, int], source_id: str, dry_run: bool = False, conn=None) -> int:
     """Insert edges into PostgreSQL graph database"""
     if dry_run:
         return len(edges)
 
-    conn = get_pg_connection()
-    cursor = conn.cursor()
-    inserted = 0
+    from psycopg2.extras import execute_values
 
+    rows = []
     for edge in edges:
         from_name = safe_db_value(edge.get('from'))
         to_name = safe_db_value(edge.get('to'))
-        edge_type = safe_db_value(edge.get('type', 'related_to'))
+        if from_name and to_name:
+            rows.append((from_name, to_name, safe_db_value(edge.get('type', 'related_to'))))
+    if not rows:
+        return 0
 
-        if not from_name or not to_name:
-            continue
-
-        from_id = node_id_map.get(from_name)
-        to_id = node_id_map.get(to_name)
-
-        # Create missing nodes
-        if not from_id:
-            cursor.execute("""
-                INSERT INTO nodes (type, name, name_normalized, source_db, created_by)
-                VALUES ('unknown', %s, %s, 'document', 'dataset_ingest')
-                RETURNING id
-            """, (from_name, from_name.lower().strip()))
-            from_id = cursor.fetchone()[0]
-            node_id_map[from_name] = from_id
-
-        if not to_id:
-            cursor.execute("""
-                INSERT INTO nodes (type, name, name_normalized, source_db, created_by)
-                VALUES ('unknown', %s, %s, 'document', 'dataset_ingest')
-                RETURNING id
-            """, (to_name, to_name.lower().strip()))
-            to_id = cursor.fetchone()[0]
-            node_id_map[to_name] = to_id
+    with pg_transaction(conn) as conn:
+        cursor = conn.cursor()
+        # Failures roll back to here rather than the whole shared transaction
+        cursor.execute("SAVEPOINT insert_edges")
 
         try:
-            cursor.execute("""
+            # Create missing nodes
+            missing = list(dict.fromkeys(
+                name for from_name, to_name, _ in rows for name in (from_name, to_name)
+                if not node_id_map.get(name)
+            ))
+            if missing:
+                created = execute_values(cursor, """
+                    INSERT INTO nodes (type, name, name_normalized, source_db, created_by)
+                    VALUES %s
+                    RETURNING name, id
+                """, [(name, name.lower().strip()) for name in missing],
+                    template="('unknown', %s, %s, 'document', 'dataset_ingest')", page_size=len(missing), fetch=True)
+                node_id_map.update(created)
+
+            edge_rows = list(dict.fromkeys(
+                (node_id_map[from_name], node_id_map[to_name], edge_type)
+                for from_name, to_name, edge_type in rows
+            ))
+            inserted = execute_values(cursor, """
                 INSERT INTO edges (from_node_id, to_node_id, type, directed, created_by)
-                VALUES (%s, %s, %s, true, 'dataset_ingest')
-            """, (from_id, to_id, edge_type))
-            inserted += 1
+                VALUES %s
+                ON CONFLICT (from_node_id, to_node_id, type) DO NOTHING
+                RETURNING id
+            """, edge_rows, template="(%s, %s, %s, true, 'dataset_ingest')", page_size=len(edge_rows), fetch=True)
         except:
-            conn.rollback()
+            cursor.execute("ROLLBACK TO SAVEPOINT insert_edges")
+            return 0
 
-    conn.commit()
-    conn.close()
-    return inserted
+    return len(inserted)
 
 
-def insert_properties(properties: List[Dict], node_id_map: Dict[str, int], source_id: str, dry_run: bool = False) -> int:
+def insert_properties(properties: List[Dict], node_id_map: Dict[str, int], source_id: str, dry_run: bool = False, conn=None) -> int:
     """Insert properties into PostgreSQL graph database"""
     if dry_run:
         return len(properties)
 
-    conn = get_pg_connection()
-    cursor = conn.cursor()
-    inserted = 0
+    from psycopg2.extras import execute_values
 
+    prop_rows = []
     for prop in properties:
         node_name = safe_db_value(prop.get('node'))
         key = safe_db_value(prop.get('key'))
@@ -749,59 +877,65 @@ def insert_properties(properties: List[Dict], node_id_map: Dict[str, int], sourc
             continue
 
         node_id = node_id_map.get(node_name)
-        if not node_id:
-            continue
+        if node_id:
+            prop_rows.append((node_id, key, value))
+    if not prop_rows:
+        return 0
+
+    with pg_transaction(conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SAVEPOINT insert_properties")
 
         try:
-            cursor.execute("""
+            execute_values(cursor, """
                 INSERT INTO properties (node_id, key, value, created_by)
-                VALUES (%s, %s, %s, 'dataset_ingest')
-            """, (node_id, key, value))
-            inserted += 1
+                VALUES %s
+            """, prop_rows, template="(%s, %s, %s, 'dataset_ingest')", page_size=len(prop_rows))
         except:
-            conn.rollback()
+            cursor.execute("ROLLBACK TO SAVEPOINT insert_properties")
+            return 0
 
-    conn.commit()
-    conn.close()
-    return inserted
+    return len(prop_rows)
 
 
-def insert_signals(signals: List[Dict], source_id: str, dry_run: bool = False) -> int:
+def insert_signals(signals: List[Dict], source_id: str, dry_run: bool = False, conn=None) -> int:
     """Insert signals as flags into PostgreSQL"""
     if dry_run:
         return len(signals)
 
-    conn = get_pg_connection()
-    cursor = conn.cursor()
-    inserted = 0
+    from psycopg2.extras import execute_values
+
+    flag_rows = [
+        (source_id, safe_db_value(signal.get('type', 'unknown')), safe_db_value(signal.get('detail', '')))
+        for signal in signals
+    ]
+    if not flag_rows:
+        return 0
 
-    for signal in signals:
-        signal_type = safe_db_value(signal.get('type', 'unknown'))
-        detail = safe_db_value(signal.get('detail', ''))
+    with pg_transaction(conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SAVEPOINT insert_signals")
 
         try:
-            cursor.execute("""
+            execute_values(cursor, """
                 INSERT INTO flags (target_type, target_id, flag_type, description, severity, created_by)
-                VALUES ('document', %s, %s, %s, 0, 'dataset_ingest')
-            """, (source_id, signal_type, detail))
-            inserted += 1
+                VALUES %s
+            """, flag_rows, template="('document', %s, %s, %s, 0, 'dataset_ingest')", page_size=len(flag_rows))
         except:
-            conn.rollback()
+            cursor.execute("ROLLBACK TO SAVEPOINT insert_signals")
+            return 0
 
-    conn.commit()
-    conn.close()
-    return inserted
+    return len(flag_rows)
 
 
-def insert_cross_references(cross_refs: List[Dict], node_id_map: Dict[str, int], source_id: str, dry_run: bool = False) -> int:
+def insert_cross_references(cross_refs: List[Dict], node_id_map: Dict[str, int], source_id: str, dry_run: bool = False, conn=None) -> int:
     """Insert cross-references as edges to existing emails (PostgreSQL)"""
     if dry_run:
         return len(cross_refs)
 
-    conn = get_pg_connection()
-    cursor = conn.cursor()
-    inserted = 0
+    from psycopg2.extras import execute_values
 
+    edge_rows = []
     for xref in cross_refs:
         entity_name = safe_db_value(xref.get('entity'))
         email_ids = xref.get('related_emails', [])
@@ -812,45 +946,52 @@ def insert_cross_references(cross_refs: List[Dict], node_id_map: Dict[str, int],
             continue
 
         for email_id in email_ids[:5]:  # Limit cross-refs
-            try:
-                cursor.execute("""
-                    INSERT INTO edges (from_node_id, to_node_id, type, directed, excerpt, created_by)
-                    VALUES (%s, %s, 'cross_reference', true, %s, 'dataset_ingest')
-                """, (entity_id, email_id, f"Email #{email_id}: {relationship}"))
-                inserted += 1
-            except:
-                conn.rollback()
+            edge_rows.append((entity_id, str(email_id), f"Email #{email_id}: {relationship}"))
+    if not edge_rows:
+        return 0
 
-    conn.commit()
-    conn.close()
-    return inserted
+    with pg_transaction(conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SAVEPOINT insert_cross_references")
 
+        try:
+            inserted = execute_values(cursor, """
+                INSERT INTO edges (from_node_id, to_node_id, type, directed, excerpt, created_by)
+                VALUES %s
+                ON CONFLICT (from_node_id, to_node_id, type) DO NOTHING
+                RETURNING id
+            """, edge_rows, template="(%s, %s, 'cross_reference', true, %s, 'dataset_ingest')",
+                page_size=len(edge_rows), fetch=True)
+        except:
+            cursor.execute("ROLLBACK TO SAVEPOINT insert_cross_references")
+            return 0
+
+    return len(inserted)
 
-def log_extraction(source_id: str, dataset_name: str, stats: Dict, dry_run: bool = False):
+
+def log_extraction(source_id: str, dataset_name: str, stats: Dict, dry_run: bool = False, conn=None):
     """Log extraction to PostgreSQL audit trail"""
     if dry_run:
         return
 
-    conn = get_pg_connection()
-    cursor = conn.cursor()
+    with pg_transaction(conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SAVEPOINT log_extraction")
 
-    try:
-        cursor.execute("""
-            INSERT INTO evidence_chain (target_type, target_id, action, new_value, reason, created_by)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (
-            'document',
-            source_id,
-            'dataset_extracted',
-            json.dumps(stats),
-            f'Dataset ingestion: {dataset_name}',
-            'dataset_ingest'
-        ))
-        conn.commit()
-    except:
-        conn.rollback()
-
-    conn.close()
+        try:
+            cursor.execute("""
+                INSERT INTO evidence_chain (target_type, target_id, action, new_value, reason, created_by)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (
+                'document',
+                source_id,
+                'dataset_extracted',
+                json.dumps(stats),
+                f'Dataset ingestion: {dataset_name}',
+                'dataset_ingest'
+            ))
+        except:
+            cursor.execute("ROLLBACK TO SAVEPOINT log_extraction")
 
 
 # =============================================================================
@@ -954,20 +1095,15 @@ async def process_batch(
 
         if dry_run:
             print(f"      [DRY-RUN] Doc {source_id}: {len(nodes)} nodes, {len(edges)} edges, {len(signals)} signals")
-        else:
-            node_id_map = insert_nodes(nodes, source_id, 'document', dry_run)
-            edges_count = insert_edges(edges, node_id_map, source_id, dry_run)
-            props_count = insert_properties(properties, node_id_map, source_id, dry_run)
-            signals_count = insert_signals(signals, source_id, dry_run)
-            xref_count = insert_cross_references(cross_refs, node_id_map, source_id, dry_run)
-
-            batch_stats['nodes'] += len(nodes)
-            batch_stats['edges'] += edges_count
-            batch_stats['properties'] += props_count
-            batch_stats['signals'] += signals_count
-            batch_stats['cross_refs'] += xref_count
+            continue
 
-            print(f"      Doc {source_id}: +{len(nodes)} nodes, +{edges_count} edges, +{xref_count} cross-refs")
+        # One pooled connection and one transaction per document
+        with pg_transaction() as conn:
+            node_id_map = insert_nodes(nodes, source_id, 'document', dry_run, conn=conn)
+            edges_count = insert_edges(edges, node_id_map, source_id, dry_run, conn=conn)
+            props_count = insert_properties(properties, node_id_map, source_id, dry_run, conn=conn)
+            signals_count = insert_signals(signals, source_id, dry_run, conn=conn)
+            xref_count = insert_cross_references(cross_refs, node_id_map, source_id, dry_run, conn=conn)
 
             log_extraction(source_id, dataset_name, {
                 'nodes': len(nodes),
@@ -975,7 +1111,15 @@ async def process_batch(
                 'properties': props_count,
                 'signals': signals_count,
                 'cross_refs': xref_count
-            }, dry_run)
+            }, dry_run, conn=conn)
+
+        batch_stats['nodes'] += len(nodes)
+        batch_stats['edges'] += edges_count
+        batch_stats['properties'] += props_count
+        batch_stats['signals'] += signals_count
+        batch_stats['cross_refs'] += xref_count
+
+        print(f"      Doc {source_id}: +{len(nodes)} nodes, +{edges_count} edges, +{xref_count} cross-refs")
 
     return batch_stats
 
@@ -181,6 +181,8 @@ CREATE TABLE IF NOT EXISTS query_log (
 
 -- Full-text search indexes
 CREATE INDEX IF NOT EXISTS idx_emails_fts ON emails USING gin(to_tsvector('english', subject || ' ' || body_text));
+CREATE INDEX IF NOT EXISTS idx_emails_sender ON emails(sender_email);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_emails_investigation_subject ON emails(subject) WHERE sender_email = 'investigation@pwnd.icu';
 CREATE INDEX IF NOT EXISTS idx_nodes_name ON nodes(name_normalized);
 CREATE INDEX IF NOT EXISTS idx_edges_from ON edges(from_node_id);
 CREATE INDEX IF NOT EXISTS idx_edges_to ON edges(to_node_id);